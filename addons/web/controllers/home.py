@@ -7,6 +7,10 @@ import psycopg2
 import inphms.exceptions
 import inphms.modules.registry
 from inphms import http
+from inphms.addons.base.models.ir_cron import cron_stats
+from inphms.service import metrics
+from inphms.tools import config
+from inphms.tools.cache import get_ormcache_stats
 from inphms.exceptions import AccessError
 from inphms.http import request
 from inphms.service import security
@@ -64,4 +68,41 @@ class Home(http.Controller):
             response.headers['X-Frame-Options'] = 'DENY'
             return response
         except AccessError:
-            return request.redirect('/web/login?error=access')
\ No newline at end of file
+            return request.redirect('/web/login?error=access')
+
+    @http.route('/web/health', type='http', auth='none', save_session=False)
+    def health(self):
+        data = json.dumps({
+            'status': 'pass',
+        })
+        headers = [('Content-Type', 'application/json'),
+                   ('Cache-Control', 'no-store')]
+        return request.make_response(data, headers)
+
+    @http.route('/web/cron/stats', type='http', auth='none', save_session=False)
+    def cron_statistics(self):
+        """ Scheduling metrics of the cron jobs run by this process. """
+        if not config['metrics_enable']:
+            raise request.not_found()
+        headers = [('Content-Type', 'application/json'),
+                   ('Cache-Control', 'no-store')]
+        return request.make_response(json.dumps(cron_stats.to_dict()), headers)
+
+    @http.route('/web/ormcache/stats', type='http', auth='none', save_session=False)
+    def ormcache_statistics(self):
+        """ Statistics of the ormcaches of the registries loaded in this
+        process, see :func:`~inphms.tools.cache.get_ormcache_stats`. """
+        if not config['metrics_enable']:
+            raise request.not_found()
+        headers = [('Content-Type', 'application/json'),
+                   ('Cache-Control', 'no-store')]
+        return request.make_response(json.dumps(get_ormcache_stats()), headers)
+
+    @http.route('/metrics', type='http', auth='none', save_session=False)
+    def server_metrics(self):
+        """ Metrics of this server process, in the text format of Prometheus. """
+        if not config['metrics_enable']:
+            raise request.not_found()
+        headers = [('Content-Type', metrics.CONTENT_TYPE),
+                   ('Cache-Control', 'no-store')]
+        return request.make_response(metrics.render(), headers)
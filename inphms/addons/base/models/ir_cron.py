@@ -1,4 +1,5 @@
 # Part of Inphms. See LICENSE file for full copyright and licensing details.
+import collections
 import logging
 import threading
 import time
@@ -14,9 +15,109 @@ from inphms import api, fields, models, _
 from inphms.exceptions import UserError
 from inphms.modules.registry import Registry
 from inphms.tools import SQL
+from inphms.tools.misc import Histogram
 
 _logger = logging.getLogger(__name__)
 
+# a job failing that many times in a row, for at least that long, is deactivated
+MIN_FAILURE_COUNT_BEFORE_DEACTIVATION = 5
+MIN_DELTA_BEFORE_DEACTIVATION = timedelta(days=7)
+# time after which a batched job should commit its progress and yield
+BATCH_TIME_LIMIT = 60
+
+# upper bounds of the buckets of the scheduling metrics, in seconds and queries
+LATENESS_BUCKETS = (1, 5, 15, 60, 300, 900, 3600)
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900)
+QUERIES_BUCKETS = (10, 100, 1000, 10000, 100000)
+# how often the cron runners log a summary of the scheduling metrics
+STATS_LOG_INTERVAL = 60 * 60
+
+_intervalTypes = {
+    'minutes': lambda interval: relativedelta(minutes=interval),
+    'hours': lambda interval: relativedelta(hours=interval),
+    'days': lambda interval: relativedelta(days=interval),
+    'weeks': lambda interval: relativedelta(days=7 * interval),
+    'months': lambda interval: relativedelta(months=interval),
+}
+
+
+class CronStats:
+    """ Scheduling metrics of the jobs run by this process: how late they
+    start compared to their ``nextcall``, how long they run, how many queries
+    they perform, and how their ``failure_count`` evolves. They help sizing
+    ``max_cron_threads``: a growing lateness means too few cron workers.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lateness = Histogram(LATENESS_BUCKETS)
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERIES_BUCKETS)
+        # number of jobs which started failing, recovered, were deactivated
+        self.transitions = collections.Counter()
+        # {(dbname, job id): stats of the job}
+        self.jobs = {}
+        self.logged = time.monotonic()
+
+    def record(self, dbname, job, lateness, duration, queries, failure_count, active):
+        self.lateness.observe(lateness)
+        self.duration.observe(duration)
+        self.queries.observe(queries)
+        with self.lock:
+            stats = self.jobs.get((dbname, job['id']))
+            if stats is None:
+                stats = self.jobs[dbname, job['id']] = {
+                    'name': job['cron_name'], 'runs': 0, 'failures': 0,
+                    'lateness_max': 0.0, 'duration_max': 0.0, 'duration_sum': 0.0,
+                }
+            stats['runs'] += 1
+            stats['failures'] += failure_count > job['failure_count']
+            stats['lateness_max'] = max(stats['lateness_max'], lateness)
+            stats['duration_max'] = max(stats['duration_max'], duration)
+            stats['duration_sum'] += duration
+            if failure_count and not job['failure_count']:
+                self.transitions['failing'] += 1
+            elif job['failure_count'] and not failure_count:
+                self.transitions['recovered'] += 1
+            if not active:
+                self.transitions['deactivated'] += 1
+
+    def to_dict(self):
+        with self.lock:
+            transitions = dict(self.transitions)
+        return {
+            'lateness': self.lateness.to_dict(),
+            'duration': self.duration.to_dict(),
+            'queries': self.queries.to_dict(),
+            'transitions': transitions,
+        }
+
+    def log(self, force=False):
+        """ Log a summary of the metrics, at most every ``STATS_LOG_INTERVAL``
+        unless forced. """
+        now = time.monotonic()
+        if not force and now - self.logged < STATS_LOG_INTERVAL:
+            return
+        self.logged = now
+        if not self.duration.count:
+            return
+        with self.lock:
+            transitions = dict(self.transitions)
+            slowest = sorted(self.jobs.items(), key=lambda item: item[1]['duration_sum'], reverse=True)[:5]
+        _logger.info("Cron jobs lateness: %r", self.lateness)
+        _logger.info("Cron jobs duration: %r", self.duration)
+        _logger.info("Cron jobs queries: %r", self.queries)
+        if transitions:
+            _logger.info("Cron jobs failures: %s", ', '.join(f"{count} {key}" for key, count in sorted(transitions.items())))
+        for (dbname, job_id), stats in slowest:
+            _logger.info("Cron job %r (%s) on %s: %d runs, %d failures, %.3fs total, "
+                         "max duration %.3fs, max lateness %.3fs",
+                         stats['name'], job_id, dbname, stats['runs'], stats['failures'],
+                         stats['duration_sum'], stats['duration_max'], stats['lateness_max'])
+
+
+cron_stats = CronStats()
+
+
 class ir_cron(models.Model):
     """ Model describing cron jobs (also called actions or tasks).
     """
@@ -60,4 +161,181 @@ class ir_cron(models.Model):
     @api.depends('ir_actions_server_id.name')
     def _compute_cron_name(self):
         for cron in self.with_context(lang='en_US'):
-            cron.cron_name = cron.ir_actions_server_id.name
\ No newline at end of file
+            cron.cron_name = cron.ir_actions_server_id.name
+
+    @classmethod
+    def _process_jobs(cls, db_name):
+        """ Run the due jobs of the database, the most urgent first.
+
+        Every job is acquired with ``SKIP LOCKED``: concurrent cron workers
+        run distinct jobs instead of waiting for each other. The lock of a job
+        is held by the transaction of ``cron_cr`` until the job is done and
+        rescheduled, while the job itself runs in its own transaction.
+        """
+        thread = threading.current_thread()
+        thread.dbname = db_name
+        try:
+            with inphms.sql_db.db_connect(db_name).cursor() as cron_cr:
+                while job := cls._acquire_one_job(cron_cr):
+                    if cls._has_other_due_jobs(cron_cr, job['id']):
+                        # let another worker run the next job meanwhile
+                        cls._notify_cron_workers(db_name)
+                    registry = Registry(db_name).check_signaling()
+                    with registry.cursor() as job_cr:
+                        env = api.Environment(job_cr, job['user_id'], {'lastcall': job['lastcall']})
+                        env['ir.cron']._process_job(cron_cr, job)
+                    # release the lock of the job
+                    cron_cr.commit()
+        except psycopg2.errors.UndefinedTable:
+            # the base module is not installed yet
+            pass
+        finally:
+            if hasattr(thread, 'dbname'):
+                del thread.dbname
+
+    @classmethod
+    def _acquire_one_job(cls, cr):
+        """ Lock and return the most urgent due job that no other worker is
+        running, or ``None`` when there is no such job. """
+        cr.execute("""
+            SELECT *
+              FROM ir_cron
+             WHERE active
+               AND nextcall <= (now() AT TIME ZONE 'UTC')
+          ORDER BY priority, nextcall
+             LIMIT 1
+               FOR NO KEY UPDATE SKIP LOCKED
+        """, log_exceptions=False)
+        return cr.dictfetchone()
+
+    @classmethod
+    def _has_other_due_jobs(cls, cr, job_id):
+        cr.execute("""
+            SELECT EXISTS(
+                SELECT 1
+                  FROM ir_cron
+                 WHERE active
+                   AND nextcall <= (now() AT TIME ZONE 'UTC')
+                   AND id != %s
+            )
+        """, [job_id])
+        return cr.fetchone()[0]
+
+    def _process_job(self, cron_cr, job):
+        """ Run the server action of the job in the transaction of the
+        environment, and reschedule the job in the transaction of ``cron_cr``.
+
+        A batched job (see :meth:`_commit_progress`) having some work left is
+        due again immediately, behind the other due jobs of the same priority,
+        instead of holding the worker until it is done.
+        """
+        thread = threading.current_thread()
+        thread.cron_progress = None
+        thread.cron_start = time.monotonic()
+        if getattr(thread, 'start_time', None):
+            # the time limit applies to every job, not to the whole database
+            thread.start_time = time.time()
+
+        _logger.info('Job %r (%s) starting', job['cron_name'], job['id'])
+        lateness = max((fields.Datetime.now() - job['nextcall']).total_seconds(), 0)
+        queries = self.env.cr.sql_log_count
+        failed = False
+        try:
+            self.env['ir.actions.server'].browse(job['ir_actions_server_id']).run()
+            self.env.cr.commit()
+        except Exception:
+            self.env.cr.rollback()
+            _logger.exception('Job %r (%s) server action #%s failed',
+                              job['cron_name'], job['id'], job['ir_actions_server_id'])
+            failed = True
+        progress = thread.cron_progress
+        duration = time.monotonic() - thread.cron_start
+        queries = self.env.cr.sql_log_count - queries
+        _logger.info('Job %r (%s) done in %.3fs, %d queries, %.3fs late',
+                     job['cron_name'], job['id'], duration, queries, lateness)
+        thread.cron_progress = thread.cron_start = None
+
+        now = fields.Datetime.now()
+        if failed:
+            failure_count = job['failure_count'] + 1
+            first_failure_date = job['first_failure_date'] or now
+            active = not (failure_count >= MIN_FAILURE_COUNT_BEFORE_DEACTIVATION
+                          and now - first_failure_date >= MIN_DELTA_BEFORE_DEACTIVATION)
+            if not active:
+                _logger.warning('Job %r (%s) deactivated after %s consecutive failures',
+                                job['cron_name'], job['id'], failure_count)
+            lastcall = job['lastcall']
+        else:
+            failure_count, first_failure_date, active, lastcall = 0, None, True, now
+
+        cron_stats.record(self.env.cr.dbname, job, lateness, duration, queries, failure_count, active)
+
+        if not failed and progress and progress['remaining']:
+            nextcall = now
+        else:
+            nextcall = job['nextcall']
+            interval = _intervalTypes[job['interval_type']](job['interval_number'])
+            while nextcall <= now:
+                nextcall += interval
+
+        cron_cr.execute(SQL("""
+            UPDATE ir_cron
+               SET nextcall = %s,
+                   lastcall = %s,
+                   failure_count = %s,
+                   first_failure_date = %s,
+                   active = %s
+             WHERE id = %s
+        """, nextcall, lastcall, failure_count, first_failure_date, active, job['id']))
+
+    @api.model
+    def _commit_progress(self, processed=0, remaining=0):
+        """ Commit the work done so far by the current batched job, and
+        return the number of seconds it may still run before it should stop
+        and let the other jobs run. The job is due again as long as it reports
+        some ``remaining`` work.
+
+        :param int processed: the number of records processed since the last call
+        :param int remaining: the number of records left to process
+        """
+        thread = threading.current_thread()
+        progress = getattr(thread, 'cron_progress', None) or {'processed': 0, 'remaining': 0}
+        progress['processed'] += processed
+        progress['remaining'] = remaining
+        thread.cron_progress = progress
+        self.env.cr.commit()
+        start = getattr(thread, 'cron_start', None) or time.monotonic()
+        return max(BATCH_TIME_LIMIT - (time.monotonic() - start), 0)
+
+    @classmethod
+    def _get_next_job_delay(cls, db_name):
+        """ Return the number of seconds until the next job of the database is
+        due, or ``None`` when the database has no active job. The jobs being
+        run by a worker are not taken into account. """
+        with inphms.sql_db.db_connect(db_name).cursor() as cr:
+            try:
+                cr.execute("""
+                    SELECT EXTRACT(EPOCH FROM nextcall - (now() AT TIME ZONE 'UTC'))
+                      FROM ir_cron
+                     WHERE active
+                  ORDER BY nextcall
+                     LIMIT 1
+                       FOR SHARE SKIP LOCKED
+                """, log_exceptions=False)
+            except psycopg2.errors.UndefinedTable:
+                # the base module is not installed yet
+                return None
+            row = cr.fetchone()
+        return None if row is None else max(float(row[0]), 0)
+
+    def _notifydb(self):
+        """ Wake up the cron workers of the database. """
+        self._notify_cron_workers(self.env.cr.dbname)
+
+    @classmethod
+    def _notify_cron_workers(cls, db_name):
+        """ Wake up the cron workers, the name of the database is the payload
+        of the notification. """
+        with inphms.sql_db.db_connect('postgres').cursor() as cr:
+            cr.execute(SQL("SELECT pg_notify('cron_trigger', %s)", db_name))
+        _logger.debug("cron workers notified")
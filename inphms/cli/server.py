@@ -10,7 +10,7 @@ GNU Public License
 (c) 2025, Ian - INPHMS
 """
 
-import atexit, csv, logging, os, re, sys
+import atexit, csv, logging, os, re, subprocess, sys
 
 from pathlib import Path
 from psycopg2.errors import InsufficientPrivilege
@@ -26,6 +26,9 @@ _logger = logging.getLogger('inphms')
 
 re._MAXCACHE = 4096
 
+# modules imported by a fresh interpreter to measure the startup import time
+STARTUP_IMPORTS = 'import inphms.cli, inphms.service.server, inphms.http'
+
 def main(args):
     check_root_user()
     inphms.tools.config.parse_config(args, setup_logging=True)
@@ -34,6 +37,10 @@ def main(args):
 
     config = inphms.tools.config
 
+    if config['profile_startup']:
+        report_import_times()
+        sys.exit(0)
+
     # the default limit for CSV fields in the module is 128KiB, which is not
     # quite sufficient to import images to store in attachment. 500MiB is a
     # bit overkill, but better safe than sorry I guess
@@ -123,6 +130,51 @@ def report_configuration(): #ichecked
             '.'.join(map(str, inphms.MAX_PY_VERSION))
         )
 
+def report_import_times(limit=25):
+    """ Log the cost of importing the modules the server needs to start, as
+    measured by ``python -X importtime`` in a fresh interpreter: the total
+    time, the modules taking the most time by themselves, and the time per
+    top-level package.
+    """
+    root_path = os.path.dirname(os.path.dirname(inphms.__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root_path, os.environ.get('PYTHONPATH')])))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_IMPORTS],
+        env=env, capture_output=True, text=True, check=False,
+    )
+    if proc.returncode:
+        _logger.error("Could not profile the startup imports:\n%s", proc.stderr[-2000:])
+        return
+
+    # lines look like "import time:  <self us> | <cumulative us> | <indent><module>"
+    # where the indentation reflects the nesting of the imports
+    timings = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        toplevel = len(name) - len(name.lstrip()) == 1
+        timings.append((name.strip(), int(self_us), int(cumulative_us), toplevel))
+
+    total = sum(cumulative for _name, _self, cumulative, toplevel in timings if toplevel)
+    _logger.info("Startup imports: %d modules in %.3fs", len(timings), total / 1e6)
+
+    lines = [
+        f"{self_us / 1e3:9.1f}ms {cumulative_us / 1e3:9.1f}ms  {name}"
+        for name, self_us, cumulative_us, _toplevel in sorted(timings, key=lambda t: -t[1])[:limit]
+    ]
+    _logger.info("Slowest modules (self, cumulative):\n%s", '\n'.join(lines))
+
+    packages = {}
+    for name, self_us, _cumulative, _toplevel in timings:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    lines = [
+        f"{self_us / 1e3:9.1f}ms  {package}"
+        for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:limit]
+    ]
+    _logger.info("Slowest packages:\n%s", '\n'.join(lines))
+
 def setup_pid_file(): #ichecked
     """ Create a file with the process id written in it.
 
@@ -139,6 +191,10 @@ def rm_pid_file(main_pid): #ichecked
     config = inphms.tools.config
     if config['pidfile'] and main_pid == os.getpid():
         try:
+            # after a graceful reload, the file belongs to the new process
+            with open(config['pidfile']) as fd:
+                if fd.read().strip() != str(main_pid):
+                    return
             os.unlink(config['pidfile'])
         except OSError:
             pass
\ No newline at end of file
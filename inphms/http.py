@@ -120,18 +120,6 @@ import babel.core
 
 from inphms.modules.registry import Registry
 
-try:
-    import geoip2.database
-    import geoip2.models
-    import geoip2.errors
-except ImportError:
-    geoip2 = None
-
-try:
-    import maxminddb
-except ImportError:
-    maxminddb = None
-
 import psycopg2
 import werkzeug.datastructures
 import werkzeug.exceptions
@@ -156,12 +144,12 @@ except ImportError:
 
 import inphms
 from .exceptions import UserError, AccessError, AccessDenied
-from .modules.module import get_manifest
+from .modules.module import get_addons_index, get_manifest
 from .modules.registry import Registry
-from .service import security, model as service_model
+from .service import metrics, security, model as service_model
 from .tools import (
     parse_version, config, file_path,
-    profiler, unique, consteq,
+    memtrace, profiler, unique, consteq,
     get_lang, json_default
 )
 from .tools.func import lazy_property, filter_kwargs
@@ -203,13 +191,6 @@ def get_default_session(): #ichecked
 
 DEFAULT_MAX_CONTENT_LENGTH = 128 * 1024 * 1024  # 128MiB
 
-# Two empty objects used when the geolocalization failed. They have the
-# sames attributes as real countries/cities except that accessing them
-# evaluates to None.
-if geoip2:
-    GEOIP_EMPTY_COUNTRY = geoip2.models.Country({})
-    GEOIP_EMPTY_CITY = geoip2.models.City({})
-
 # The request mimetypes that transport JSON in their body.
 JSON_MIMETYPES = ('application/json', 'application/json-rpc')
 
@@ -688,6 +669,11 @@ def route(route=None, **routing):
     :param Union[bool, Callable[[registry, request], bool]] readonly:
         Whether this endpoint should open a cursor on a read-only
         replica instead of (by default) the primary read/write database.
+    :param float statement_timeout: The maximum duration, in seconds, of
+        each SQL statement executed while serving the request. Slower
+        statements are cancelled by PostgreSQL.
+    :param int max_queries: The maximum number of SQL queries the request
+        may execute on its cursor before it is aborted.
     :param Callable[[Exception], Response] handle_params_access_error:
         Implement a custom behavior if an error occurred when retrieving the record
         from the URL parameters (access error or missing error).
@@ -1142,6 +1128,25 @@ class Session(collections.abc.MutableMapping):
 # GeoIP
 # =========================================================
 
+@functools.cache
+def _geoip():
+    """ Import and return the ``geoip2`` and ``maxminddb`` modules. They are
+    slow to import and only needed once a request is geolocalized. """
+    import geoip2.database  # noqa: PLC0415
+    import geoip2.errors  # noqa: PLC0415
+    import geoip2.models  # noqa: PLC0415
+    import maxminddb  # noqa: PLC0415
+    return geoip2, maxminddb
+
+@functools.cache
+def _geoip_empty_records():
+    """ Return two empty objects used when the geolocalization failed. They
+    have the sames attributes as real countries/cities except that accessing
+    them evaluates to None. """
+    geoip2, _maxminddb = _geoip()
+    return geoip2.models.Country({}), geoip2.models.City({})
+
+
 class GeoIP(collections.abc.Mapping):
     """
     Ip Geolocalization utility, determine information such as the
@@ -1174,12 +1179,13 @@ class GeoIP(collections.abc.Mapping):
 
     @lazy_property
     def _city_record(self):
+        geoip2, maxminddb = _geoip()
         try:
             return root.geoip_city_db.city(self.ip)
         except (OSError, maxminddb.InvalidDatabaseError):
-            return GEOIP_EMPTY_CITY
+            return _geoip_empty_records()[1]
         except geoip2.errors.AddressNotFoundError:
-            return GEOIP_EMPTY_CITY
+            return _geoip_empty_records()[1]
 
     @lazy_property
     def _country_record(self):
@@ -1187,12 +1193,13 @@ class GeoIP(collections.abc.Mapping):
             # the City class inherits from the Country class and the
             # city record is in cache already, save a geolocalization
             return self._city_record
+        geoip2, maxminddb = _geoip()
         try:
             return root.geoip_country_db.country(self.ip)
         except (OSError, maxminddb.InvalidDatabaseError):
             return self._city_record
         except geoip2.errors.AddressNotFoundError:
-            return GEOIP_EMPTY_COUNTRY
+            return _geoip_empty_records()[0]
 
     @property
     def country_name(self):
@@ -1205,9 +1212,10 @@ class GeoIP(collections.abc.Mapping):
     def __getattr__(self, attr):
         # Be smart and determine whether the attribute exists on the
         # country object or on the city object.
-        if hasattr(GEOIP_EMPTY_COUNTRY, attr):
+        empty_country, empty_city = _geoip_empty_records()
+        if hasattr(empty_country, attr):
             return getattr(self._country_record, attr)
-        if hasattr(GEOIP_EMPTY_CITY, attr):
+        if hasattr(empty_city, attr):
             return getattr(self._city_record, attr)
         raise AttributeError(f"{self} has no attribute {attr!r}")
 
@@ -1788,6 +1796,7 @@ class Request:
                 ]
                 raise BadRequest(f"Request inferred type is compatible with {compatible_dispatchers} but {routing['routes'][0]!r} is type={routing['type']!r}.")
         self.dispatcher = dispatcher_cls(self)
+        threading.current_thread().route = rule.rule
     
     def reroute(self, path, query_string=None):
         """
@@ -1996,10 +2005,15 @@ class Request:
         self.registry['ir.http']._post_dispatch(response)
         return response
 
-    def _transactioning(self, func, readonly):
+    def _transactioning(self, func, readonly, routing=None):
         """
         Call ``func`` within a new SQL transaction.
 
+        The ``statement_timeout`` and ``max_queries`` options of the
+        given ``routing`` bound the resources of the cursor, so that a
+        runaway endpoint fails fast instead of holding a connection of
+        the pool until the ``limit_time_real`` watchdog kicks in.
+
         If ``func`` performs a write query (insert/update/delete) on a
         read-only transaction, the transaction is rolled back, and
         ``func`` is called again in a read-write transaction.
@@ -2023,6 +2037,11 @@ class Request:
             )
 
             with contextlib.closing(self.registry.cursor(readonly=readonly_cr)) as cr:
+                if routing:
+                    cr.set_resource_limits(
+                        statement_timeout=routing.get('statement_timeout'),
+                        max_queries=routing.get('max_queries'),
+                    )
                 self.env = self.env(cr=cr)
                 try:
                     return service_model.retrying(func, env=self.env)
@@ -2077,6 +2096,7 @@ class Request:
         return self._transactioning(
             functools.partial(self._serve_ir_http, rule, args),
             readonly=readonly,
+            routing=rule.endpoint.routing,
         )
 
 # =========================================================
@@ -2369,14 +2389,12 @@ class Application:
         system.
         """
         mod2path = {}
-        for addons_path in inphms.addons.__path__:
-            for module in os.listdir(addons_path):
-                manifest = get_manifest(module)
-                static_path = opj(addons_path, module, 'static')
-                if (manifest
-                        and (manifest['installable'] or manifest['assets'])
-                        and os.path.isdir(static_path)):
-                    mod2path[module] = static_path
+        for module, addon in get_addons_index().items():
+            if not addon.static_path:
+                continue
+            manifest = get_manifest(module)
+            if manifest['installable'] or manifest['assets']:
+                mod2path[module] = addon.static_path
         return mod2path
 
     def get_static_file(self, url, host=''): #ichecked
@@ -2429,6 +2447,8 @@ class Application:
             del current_thread.dbname
         if hasattr(current_thread, 'uid'):
             del current_thread.uid
+        if hasattr(current_thread, 'route'):
+            del current_thread.route
 
         if inphms.tools.config['proxy_mode'] and environ.get("HTTP_X_FORWARDED_HOST"):
             # The ProxyFix middleware has a side effect of updating the
@@ -2439,7 +2459,7 @@ class Application:
                 return
             ProxyFix(fake_app)(environ, fake_start_response)
         
-        with HTTPRequest(environ) as httprequest:
+        with metrics.observe_request(), memtrace.sample_request(), HTTPRequest(environ) as httprequest:
             request = Request(httprequest)
             _request_stack.push(request)
 
@@ -2448,6 +2468,7 @@ class Application:
                 current_thread.url = httprequest.url
 
                 if self.get_static_file(httprequest.path):
+                    current_thread.route = '<static>'
                     response = request._serve_static()
                 elif request.db:
                     try:
@@ -2501,6 +2522,7 @@ class Application:
 
     @lazy_property
     def geoip_city_db(self):
+        geoip2, maxminddb = _geoip()
         try:
             return geoip2.database.Reader(config['geoip_city_db'])
         except (OSError, maxminddb.InvalidDatabaseError):
@@ -2512,6 +2534,7 @@ class Application:
 
     @lazy_property
     def geoip_country_db(self):
+        geoip2, maxminddb = _geoip()
         try:
             return geoip2.database.Reader(config['geoip_country_db'])
         except (OSError, maxminddb.InvalidDatabaseError) as exc:
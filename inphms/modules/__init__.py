@@ -13,9 +13,11 @@ from inphms.modules.loading import load_modules, reset_modules_state
 
 from inphms.modules.module import (
     initialize_sys_path,
+    get_addons_index,
     get_modules,
     get_module_path,
     load_inphms_module,
     get_manifest,
+    mutable_manifest,
     adapt_version,
 )
\ No newline at end of file
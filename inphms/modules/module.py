@@ -4,21 +4,22 @@
 import ast
 import collections.abc
 import copy
-import functools
 import importlib
 import importlib.metadata
 import logging
 import os
 import re
 import sys
+import threading
 import traceback
+import typing
 import warnings
 from os.path import join as opj, normpath
 
 import inphms
 import inphms.tools as tools
 import inphms.release as release
-from inphms.tools.misc import file_path
+from inphms.tools.misc import file_path, frozendict
 
 try:
     from packaging.requirements import InvalidRequirement, Requirement
@@ -177,33 +178,73 @@ def load_inphms_module(module_name):
         _logger.critical("Couldn't load module %s", module_name)
         raise
 
-def get_modules():
-    """Returns the list of module names
+class Addon(typing.NamedTuple):
+    """ Entry of the addons index, see :func:`get_addons_index`. """
+    path: str                   # path of the module directory
+    manifest_file: str          # path of the module manifest
+    static_path: str | None     # path of the ``static`` directory, if any
+
+
+_addons_index_lock = threading.Lock()
+# (addons paths key, {module: Addon}, {(module, manifest file): (mtime, manifest)})
+_addons_index = (None, {}, {})
+
+
+def get_addons_index():
+    """ Return a dict mapping the names of the modules found in the addons
+    paths to their :class:`Addon`. When a module is found in several addons
+    paths, the first one wins.
+
+    The index is only rebuilt when the addons paths or their modification
+    time change, i.e. when a module is added to or removed from them.
     """
-    def listdir(dir):
-        def clean(name):
-            name = os.path.basename(name)
-            if name[-4:] == '.zip':
-                name = name[:-4]
-            return name
-
-        def is_really_module(name):
-            for mname in MANIFEST_NAMES:
-                if os.path.isfile(opj(dir, name, mname)):
-                    return True
-        return [
-            clean(it)
-            for it in os.listdir(dir)
-            if is_really_module(it)
-        ]
-
-    plist = []
+    return _get_addons_index()[1]
+
+def _get_addons_index():
+    global _addons_index  # noqa: PLW0603
+    key = _addons_paths_key()
+    with _addons_index_lock:
+        if _addons_index[0] != key:
+            index = _scan_addons_paths(key)
+            # the parsed manifests remain valid as long as their file does not change
+            manifest_files = {addon.manifest_file for addon in index.values()}
+            manifests = {
+                manifest_key: entry
+                for manifest_key, entry in _addons_index[2].items()
+                if manifest_key[1] in manifest_files
+            }
+            _addons_index = (key, index, manifests)
+        return _addons_index
+
+def _addons_paths_key():
+    key = []
     for ad in inphms.addons.__path__:
-        if not os.path.exists(ad):
+        try:
+            key.append((ad, os.stat(ad).st_mtime_ns))
+        except OSError:
+            key.append((ad, None))
+    return tuple(key)
+
+def _scan_addons_paths(key):
+    index = {}
+    for ad, mtime in key:
+        if mtime is None:
             _logger.warning("addons path does not exist: %s", ad)
             continue
-        plist.extend(listdir(ad))
-    return sorted(set(plist))
+        for name in os.listdir(ad):
+            if name in index:
+                continue
+            mod_path = opj(ad, name)
+            manifest_file = module_manifest(mod_path)
+            if manifest_file:
+                static_path = opj(mod_path, 'static')
+                index[name] = Addon(mod_path, manifest_file, static_path if os.path.isdir(static_path) else None)
+    return index
+
+def get_modules():
+    """Returns the list of module names
+    """
+    return sorted(get_addons_index())
 
 def get_module_path(module, downloaded=False, display_warning=True):
     """Return the path of the given module.
@@ -215,11 +256,9 @@ def get_module_path(module, downloaded=False, display_warning=True):
     """
     if re.search(r"[\/\\]", module):
         return False
-    for adp in inphms.addons.__path__:
-        files = [opj(adp, module, manifest) for manifest in MANIFEST_NAMES] +\
-                [opj(adp, module + '.zip')]
-        if any(os.path.exists(f) for f in files):
-            return opj(adp, module)
+    addon = get_addons_index().get(module)
+    if addon:
+        return addon.path
 
     if downloaded:
         return opj(tools.config.addons_data_dir, module)
@@ -235,15 +274,62 @@ def get_manifest(module, mod_path=None):
     :param Optional[str] mod_path: The optional path to the module on
         the file-system. If not set, it is determined by scanning the
         addons-paths.
-    :returns: The module manifest as a dict or an empty dict
-        when the manifest was not found.
-    :rtype: dict
+    :returns: The module manifest as a frozendict or an empty frozendict
+        when the manifest was not found. The manifest is shared between the
+        callers and deeply immutable: dicts are frozendicts, lists are tuples
+        and sets are frozensets. Use :func:`mutable_manifest` to get a copy
+        that can be modified. The parsed manifest is kept in the addons
+        index until the manifest file is modified.
+    :rtype: frozendict
     """
-    return copy.deepcopy(_get_manifest_cached(module, mod_path))
+    _key, index, manifests = _get_addons_index()
+    addon = None if mod_path else index.get(module)
+    if addon:
+        manifest_file = addon.manifest_file
+    else:
+        mod_path = mod_path or get_module_path(module, downloaded=True)
+        manifest_file = module_manifest(mod_path)
+    if not manifest_file:
+        _logger.debug('module %s: no manifest file found %s', module, MANIFEST_NAMES)
+        return frozendict()
+    try:
+        mtime = os.stat(manifest_file).st_mtime_ns
+    except OSError:
+        mtime = None
+    manifest_key = (module, manifest_file)
+    entry = manifests.get(manifest_key)
+    if entry is None or entry[0] != mtime:
+        entry = manifests[manifest_key] = (mtime, _freeze(load_manifest(module, addon.path if addon else mod_path)))
+    return entry[1]
+
+def mutable_manifest(module, mod_path=None):
+    """
+    Get a copy of the module manifest that the caller is free to modify,
+    see :func:`get_manifest`.
 
-@functools.lru_cache(maxsize=None)
-def _get_manifest_cached(module, mod_path=None):
-    return load_manifest(module, mod_path)
+    :rtype: dict
+    """
+    return _thaw(get_manifest(module, mod_path))
+
+def _freeze(value):
+    """ Return a deeply immutable version of the given manifest value. """
+    if isinstance(value, dict):
+        return frozendict((key, _freeze(val)) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(val) for val in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(val) for val in value)
+    return value
+
+def _thaw(value):
+    """ Return a mutable deep copy of a value frozen by :func:`_freeze`. """
+    if isinstance(value, dict):
+        return {key: _thaw(val) for key, val in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(val) for val in value]
+    if isinstance(value, frozenset):
+        return {_thaw(val) for val in value}
+    return value
 
 def load_manifest(module, mod_path=None):
     """ Load the module manifest from the file system. """
@@ -325,4 +411,25 @@ def adapt_version(version):
         raise ValueError(f"Invalid version {base_version!r}. Modules should have a version in format `x.y`, `x.y.z`,"
                          f" `{serie}.x.y` or `{serie}.x.y.z`.")
 
-    return version
\ No newline at end of file
+    return version
+
+if __name__ == '__main__':
+    # startup benchmark: python -m inphms.modules.module [server options]
+    import time
+
+    tools.config.parse_config(sys.argv[1:])
+
+    def bench(label, func, rounds):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        print(f"{label:>32}: {(time.perf_counter() - start) / rounds * 1000:9.3f} ms")
+
+    modules = get_modules()
+    print(f"{len(modules)} modules in {len(inphms.addons.__path__)} addons paths")
+    bench("addons index scan", lambda: _scan_addons_paths(_addons_paths_key()), 10)
+    bench("manifests parsed and frozen", lambda: [_freeze(load_manifest(module)) for module in modules], 3)
+    bench("manifests shared (first call)", lambda: [get_manifest(module) for module in modules], 1)
+    bench("manifests shared", lambda: [get_manifest(module) for module in modules], 100)
+    bench("manifests deep-copied", lambda: [copy.deepcopy(get_manifest(module)) for module in modules], 10)
+    bench("manifests thawed", lambda: [mutable_manifest(module) for module in modules], 10)
@@ -8,6 +8,7 @@ from __future__ import annotations
 import inspect
 import logging
 import os
+import select
 import threading
 import time
 import typing
@@ -18,6 +19,7 @@ from contextlib import closing, contextmanager, nullcontext
 from functools import partial
 from operator import attrgetter
 
+import psutil
 import psycopg2
 
 import inphms
@@ -31,7 +33,7 @@ from inphms.tools import (
     # ,
 )
 from inphms.tools.func import locked
-from inphms.tools.lru import LRU
+from inphms.tools.lru import LRU, ShardedLRU
 # from inphms.tools.misc import Collector, format_frame
 from inphms.tools.misc import Collector
 
@@ -51,6 +53,18 @@ _REGISTRY_CACHES = {
     'groups': 1,  # contains all res.groups
 }
 
+# bounds of the caches besides their number of entries: 'max_size' is the
+# total estimated size of their values in bytes, and 'ttl' the number of
+# seconds after which their entries expire, so that large or seldom used
+# values cannot grow the caches without bound
+_REGISTRY_CACHES_LIMITS = {
+    'assets': {'max_size': 64 * 1024 * 1024},
+    'templates': {'max_size': 128 * 1024 * 1024, 'ttl': 24 * 3600},
+    'routing': {'max_size': 64 * 1024 * 1024, 'ttl': 24 * 3600},
+    'routing.rewrites': {'ttl': 3600},
+    'templates.cached_values': {'max_size': 64 * 1024 * 1024, 'ttl': 3600},
+}
+
 # cache invalidation dependencies, as follows:
 # { 'cache_key': ('cache_container_1', 'cache_container_3', ...) }
 _CACHES_BY_KEY = {
@@ -63,6 +77,22 @@ _CACHES_BY_KEY = {
 
 _REPLICA_RETRY_TIME = 20 * 60  # 20 minutes
 
+# memory accounted for a registry whose measured footprint is lower, as a
+# registry also needs working memory to process requests
+_REGISTRY_MIN_FOOTPRINT = 15 * 1024 * 1024  # 15MB
+
+# channel on which registry and cache invalidations are notified, the payload
+# being the name of the database
+_SIGNALING_CHANNEL = 'registry_signaling'
+# maximum time a registry trusts the signaling listener before polling the
+# signaling sequences anyway, in case a notification got lost
+_SIGNALING_POLL_INTERVAL = 5 * 60  # 5 minutes
+
+
+def _memory_usage():
+    """ Return the resident memory of the current process, in bytes. """
+    return psutil.Process(os.getpid()).memory_info().rss
+
 
 def _unaccent(x):
     if isinstance(x, SQL):
@@ -92,11 +122,19 @@ class Registry(Mapping):
                 # cannot specify the memory limit soft on windows...
                 size = 42
             else:
-                # A registry takes 10MB of memory on average, so we reserve
-                # 10Mb (registry) + 5Mb (working memory) per registry
-                avgsz = 15 * 1024 * 1024
-                size = int(config['limit_memory_soft'] / avgsz)
+                # The registries are bounded by their footprint measured in
+                # new(); the count only bounds registries being loaded.
+                size = int(config['limit_memory_soft'] / _REGISTRY_MIN_FOOTPRINT)
+                return LRU(size, max_size=config['limit_memory_soft'] or None)
         return LRU(size)
+
+    @classmethod
+    def memory_footprints(cls):
+        """ Return a dict mapping the names of the databases to the measured
+        memory footprint of their registry, in bytes, from the most recently
+        used one. """
+        with cls.registries._lock:
+            return {db_name: cls.registries.sizes.get(db_name, 0) for db_name in cls.registries.d}
     
     def __new__(cls, db_name):
         """ Return the registry for the given database name."""
@@ -123,7 +161,10 @@ class Registry(Mapping):
         self._fields_by_model = None
         self._ordinary_tables = None
         self._constraint_queue = deque()
-        self.__caches = {cache_name: LRU(cache_size) for cache_name, cache_size in _REGISTRY_CACHES.items()}
+        self.__caches = {
+            cache_name: ShardedLRU(cache_size, **_REGISTRY_CACHES_LIMITS.get(cache_name, {}))
+            for cache_name, cache_size in _REGISTRY_CACHES.items()
+        }
 
         # modules fully loaded (maintained during init phase by `loading` module)
         self._init_modules = set()
@@ -164,6 +205,10 @@ class Registry(Mapping):
         # invalidated (i.e. cleared).
         self.registry_sequence = None
         self.cache_sequences = {}
+        # generation of the signaling listener and time at which the
+        # sequences above were read from the database, see check_signaling()
+        self._signaling_generation = None
+        self._signaling_time = None
 
         # Flags indicating invalidation of the registry or the cache.
         self._invalidation_flags = threading.local()
@@ -188,6 +233,7 @@ class Registry(Mapping):
         """ Create and return a new registry for the given database name. """
         print("new registry", db_name, force_demo, status, update_module)
         t0 = time.time()
+        memory0 = _memory_usage()
         registry = object.__new__(cls)
         registry.init(db_name)
         registry.new = registry.init = registry.registries = None
@@ -221,7 +267,15 @@ class Registry(Mapping):
         registry.registry_invalidated = bool(update_module)
         registry.signal_changes()
 
-        _logger.info("Registry loaded in %.3fs", time.time() - t0)
+        # Registries are loaded one at a time (see @locked), so the growth of
+        # the process memory is a fair estimate of the footprint of this one.
+        footprint = max(_memory_usage() - memory0, _REGISTRY_MIN_FOOTPRINT)
+        _logger.info("Registry loaded in %.3fs (%.1fMB)", time.time() - t0, footprint / 1024 / 1024)
+        evicted = cls.registries.set_size(db_name, footprint)
+        for evicted_name, evicted_footprint in evicted:
+            _logger.info("Registry of %r (%.1fMB) evicted, registries use %.1fMB of %.1fMB",
+                         evicted_name, evicted_footprint / 1024 / 1024,
+                         cls.registries.total_size / 1024 / 1024, cls.registries.max_size / 1024 / 1024)
         return registry
     
     #
@@ -274,6 +328,7 @@ class Registry(Mapping):
         if self.in_test_mode():
             return
 
+        generation = signaling_listener().generation(self.db_name)
         with self.cursor() as cr:
             # The `base_registry_signaling` sequence indicates when the registry
             # must be reloaded.
@@ -294,6 +349,8 @@ class Registry(Mapping):
             db_registry_sequence, db_cache_sequences = self.get_sequences(cr)
             self.registry_sequence = db_registry_sequence
             self.cache_sequences.update(db_cache_sequences)
+            self._signaling_generation = generation
+            self._signaling_time = time.monotonic()
 
             _logger.debug("Multiprocess load registry signaling: [Registry: %s] %s",
                           self.registry_sequence, ' '.join('[Cache %s: %s]' % cs for cs in self.cache_sequences.items()))
@@ -301,12 +358,27 @@ class Registry(Mapping):
     def check_signaling(self, cr=None):
         """ Check whether the registry has changed, and performs all necessary
         operations to update the registry. Return an up-to-date registry.
+
+        The signaling sequences are only read when the signaling listener
+        received a notification for the database since they were last read,
+        when the listener is not connected, or every
+        ``_SIGNALING_POLL_INTERVAL`` seconds as a fallback.
         """
         if self.in_test_mode():
             return self
 
+        generation = signaling_listener().generation(self.db_name)
+        if (
+            generation is not None
+            and generation == self._signaling_generation
+            and time.monotonic() < self._signaling_time + _SIGNALING_POLL_INTERVAL
+        ):
+            return self
+
         with nullcontext(cr) if cr is not None else closing(self.cursor()) as cr:
             db_registry_sequence, db_cache_sequences = self.get_sequences(cr)
+            self._signaling_generation = generation
+            self._signaling_time = time.monotonic()
             changes = ''
             # Check if the model registry must be reloaded
             if self.registry_sequence != db_registry_sequence:
@@ -363,9 +435,25 @@ class Registry(Mapping):
                     # otherwise, self.cache_sequences[cache_name] should be equal to cr.fetchone()[0]
                     self.cache_sequences[cache_name] += 1
 
+        if self.registry_invalidated or self.cache_invalidated:
+            self._notify_signaling()
+
         self.registry_invalidated = False
         self.cache_invalidated.clear()
 
+    def _notify_signaling(self):
+        """ Wake up the signaling listeners of all the processes, so that they
+        check the signaling sequences of the database on their next request.
+        The notification is sent on the ``postgres`` database, as it is the
+        one the listeners are connected to.
+        """
+        try:
+            with closing(inphms.sql_db.db_connect('postgres').cursor()) as cr:
+                cr.execute(SQL("SELECT pg_notify(%s, %s)", _SIGNALING_CHANNEL, self.db_name))
+                cr.commit()
+        except psycopg2.Error:
+            _logger.warning("Could not notify the registry signaling, other processes will poll it", exc_info=True)
+
     def in_test_mode(self):
         """ Test whether the registry is in 'test' mode. """
         return self.test_cr is not None
@@ -398,4 +486,105 @@ class Registry(Mapping):
                     self._db_readonly_failed_time = time.monotonic()
                     _logger.warning("Failed to open a readonly cursor, falling back to read-write cursor for %dmin %dsec", *divmod(_REPLICA_RETRY_TIME, 60))
             threading.current_thread().cursor_mode = 'ro->rw'
-        return self._db.cursor()
\ No newline at end of file
+        return self._db.cursor()
+
+
+class SignalingListener:
+    """ Background thread listening for the registry signaling notifications
+    sent by :meth:`Registry.signal_changes` of any process.
+
+    It maintains a generation per database, which changes every time the
+    database is notified, and when the listener (re)connects as notifications
+    may have been missed in between. Registries compare it with the generation
+    they saw when reading the signaling sequences, which turns the check done
+    on every request into a memory comparison.
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self.epoch = 0
+        self.connected = False
+        self.notifications = defaultdict(int)
+        self.thread = threading.Thread(target=self.run, name="inphms.modules.registry.signaling", daemon=True)
+        self.thread.type = 'signaling'
+
+    def generation(self, db_name):
+        """ Return the current generation of the given database, or ``None``
+        if the listener is not connected, in which case the signaling
+        sequences must be polled.
+        """
+        if not self.connected:
+            return None
+        return (self.epoch, self.notifications[db_name])
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                conn = inphms.sql_db.db_connect('postgres')
+                # the connections to 'postgres' are not kept in the pool
+                with closing(conn.cursor()) as cr:
+                    try:
+                        if not self._listen(cr):
+                            # the registries poll the signaling sequences
+                            return
+                    finally:
+                        self.connected = False
+            except Exception:
+                _logger.warning("Registry signaling listener disconnected, polling the signaling sequences", exc_info=True)
+            time.sleep(_SIGNALING_POLL_INTERVAL / 10)
+
+    def _listen(self, cr):
+        """ Listen for the notifications until the connection fails; return
+        ``False`` if notifications cannot be listened for. """
+        pg_conn = cr._cnx
+        # LISTEN / NOTIFY doesn't work in recovery mode
+        cr.execute("SELECT pg_is_in_recovery()")
+        if cr.fetchone()[0]:
+            _logger.warning("PG cluster in recovery mode, registry signaling listener not activated")
+            return False
+        cr.execute(SQL("LISTEN %s", SQL.identifier(_SIGNALING_CHANNEL)))
+        cr.commit()
+        self.epoch += 1
+        self.connected = True
+        _logger.debug("Registry signaling listener connected")
+        while True:
+            select.select([pg_conn], [], [], _SIGNALING_POLL_INTERVAL)
+            pg_conn.poll()
+            while pg_conn.notifies:
+                notify = pg_conn.notifies.pop(0)
+                self.notifications[notify.payload] += 1
+
+
+_signaling_listener = None
+_signaling_listener_lock = threading.Lock()
+# pid of the process that must not listen, see disable_signaling_listener()
+_signaling_listener_disabled_pid = None
+
+
+def signaling_listener():
+    """ Return the signaling listener of the current process, start it if
+    needed (i.e. on first use, and after a fork). """
+    global _signaling_listener  # noqa: PLW0603
+    with _signaling_listener_lock:
+        if _signaling_listener is None or _signaling_listener.pid != os.getpid():
+            _signaling_listener = SignalingListener()
+            if _signaling_listener_disabled_pid != os.getpid():
+                _signaling_listener.start()
+        return _signaling_listener
+
+
+def disable_signaling_listener():
+    """ Don't listen for the signaling notifications in the current process,
+    whose registries then poll the signaling sequences. The processes forked
+    from it still listen.
+
+    Meant for the prefork master: the listening connection would be inherited
+    by the workers, which would close the master's session along with it.
+    """
+    global _signaling_listener_disabled_pid  # noqa: PLW0603
+    with _signaling_listener_lock:
+        assert _signaling_listener is None or _signaling_listener.pid != os.getpid(), \
+            "The signaling listener of this process is already started"
+        _signaling_listener_disabled_pid = os.getpid()
@@ -0,0 +1,253 @@
+# Part of Inphms, see License file for full copyright and licensing details.
+
+""" ASGI adapter of the WSGI application :data:`inphms.http.root`.
+
+The requests are dispatched by the WSGI application in a pool of threads,
+while the event loop takes care of the network: it reads the request body
+before handing the request over to a thread, and sends the response once the
+thread is done with it, so that slow clients don't hold a thread. Static
+files and health checks don't need the application and are served by the
+event loop itself.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import mimetypes
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from inphms.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# size above which the request bodies and the responses are buffered on disk
+SPOOL_MAX_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class ASGIApplication:
+    """ ASGI application serving the given WSGI application.
+
+    :param app: the WSGI application, usually :data:`inphms.http.root`
+    :param int max_threads: the size of the pool of threads running the WSGI
+        application, by default half the database connections left by the
+        cron workers
+    :param watchdog: the :class:`~inphms.service.server.Watchdog` enforcing
+        the real time limit of the requests, if any
+    :param int max_content_length: the maximum size of the request bodies,
+        which are read before the request is routed; by default the one of
+        :mod:`inphms.http` for the routes that don't override it
+    """
+    def __init__(self, app, max_threads=None, watchdog=None, max_content_length=None):
+        from inphms.http import DEFAULT_MAX_CONTENT_LENGTH  # noqa: PLC0415
+        self.app = app
+        self.watchdog = watchdog
+        self.max_content_length = max_content_length or DEFAULT_MAX_CONTENT_LENGTH
+        if not max_threads:
+            max_threads = max((config['db_maxconn'] - config['max_cron_threads']) // 2, 1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_threads, thread_name_prefix='inphms.service.asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            # websockets are served by the gevent server
+            await send({'type': 'websocket.close', 'code': 1003})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        path = scope['path']
+        if path == '/web/health':
+            await self._send(send, 200, [
+                (b'content-type', b'application/json'),
+                (b'cache-control', b'no-store'),
+            ], b'{"status": "pass"}')
+            return
+
+        # the debug mode disables the cache of the static files, leave them
+        # to the application in that case
+        if '/static/' in path and b'debug=' not in scope['query_string']:
+            loop = asyncio.get_running_loop()
+            filepath = await loop.run_in_executor(None, self.app.get_static_file, path)
+            if filepath and await self._serve_static(scope, send, filepath):
+                return
+
+        await self._serve_wsgi(scope, receive, send)
+
+    async def _serve_static(self, scope, send, filepath):
+        """ Serve the given static file, return whether it could be read. """
+        from inphms.http import STATIC_CACHE  # noqa: PLC0415
+        loop = asyncio.get_running_loop()
+        try:
+            stat = await loop.run_in_executor(None, os.stat, filepath)
+            file = await loop.run_in_executor(None, open, filepath, 'rb')
+        except OSError:
+            return False
+
+        with file:
+            etag = f'"{int(stat.st_mtime)}-{stat.st_size}"'
+            mimetype = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+            headers = [
+                (b'cache-control', f'public, max-age={STATIC_CACHE}'.encode()),
+                (b'etag', etag.encode()),
+                (b'x-content-type-options', b'nosniff'),
+            ]
+            if mimetype.startswith('image/'):
+                headers.append((b'content-security-policy', b"default-src 'none'"))
+            if dict(scope['headers']).get(b'if-none-match') == etag.encode():
+                await self._send(send, 304, headers, b'')
+                return True
+
+            headers += [
+                (b'content-type', mimetype.encode()),
+                (b'content-length', str(stat.st_size).encode()),
+            ]
+            if scope['method'] == 'HEAD':
+                await self._send(send, 200, headers, b'')
+                return True
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            while chunk := await loop.run_in_executor(None, file.read, CHUNK_SIZE):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        return True
+
+    async def _serve_wsgi(self, scope, receive, send):
+        content_length = dict(scope['headers']).get(b'content-length', b'')
+        if content_length.isdigit() and int(content_length) > self.max_content_length:
+            await self._send_too_large(send)
+            return
+
+        body = tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE)
+        output = None
+        try:
+            size = 0
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunk = message.get('body', b'')
+                # the body may be chunked, or longer than announced
+                size += len(chunk)
+                if size > self.max_content_length:
+                    await self._send_too_large(send)
+                    return
+                body.write(chunk)
+                more_body = message.get('more_body', False)
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            environ = self._make_environ(scope, body)
+            status, headers, output = await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while chunk := output.read(CHUNK_SIZE):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            body.close()
+            if output is not None:
+                output.close()
+
+    def _call_wsgi(self, environ):
+        """ Run the WSGI application, and return the status, the headers and
+        a file containing the body of the response. """
+        output = tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE)
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            started[:] = [status, headers]
+            return output.write
+
+        # the attributes the watchdog relies on, like the threaded server's
+        me = threading.current_thread()
+        me.type = 'http'
+        me.start_time = time.time()
+        if self.watchdog:
+            self.watchdog.watch(me)
+        try:
+            result = self.app(environ, start_response)
+            try:
+                for chunk in result:
+                    output.write(chunk)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except BaseException:
+            output.close()
+            raise
+        finally:
+            if self.watchdog:
+                self.watchdog.release(me)
+            me.start_time = None
+            for attr in ('dbname', 'uid', 'url', 'route', 'query_count', 'query_time', 'perf_t0', 'cursor_mode'):
+                me.__dict__.pop(attr, None)
+        output.seek(0)
+
+        status, headers = started
+        return (
+            int(status.split(' ', 1)[0]),
+            [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            output,
+        )
+
+    def _make_environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            key = name.decode('latin-1').upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = f'HTTP_{key}'
+            value = value.decode('latin-1')
+            if key in environ:
+                # RFC 6265 5.4: the cookies are joined by "; "
+                separator = '; ' if key == 'HTTP_COOKIE' else ','
+                value = f'{environ[key]}{separator}{value}'
+            environ[key] = value
+        return environ
+
+    async def _send_too_large(self, send):
+        await self._send(send, 413, [
+            (b'content-type', b'text/plain'),
+            (b'connection', b'close'),
+        ], b'Request Entity Too Large')
+
+    async def _send(self, send, status, headers, body):
+        headers = headers + [(b'content-length', str(len(body)).encode())] if body else headers
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
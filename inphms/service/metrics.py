@@ -0,0 +1,197 @@
+# Part of Inphms, see License file for full copyright and licensing details.
+""" Metrics of the server process, in the text exposition format of
+Prometheus, see https://prometheus.io/docs/instrumenting/exposition_formats/
+
+The metrics are those of the current process: in multi-process mode, every
+worker exports its own.
+"""
+import contextlib
+import threading
+import time
+from collections import defaultdict
+
+from inphms import sql_db
+from inphms.modules.registry import Registry
+from inphms.tools.cache import STAT
+from inphms.tools.misc import Histogram
+
+# upper bounds of the buckets of the request durations, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+# {route: Histogram}
+_requests = {}
+
+
+@contextlib.contextmanager
+def observe_request():
+    """ Measure the duration of the current request, and count it for the
+    ``route`` attribute the request sets on the current thread. """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        route = getattr(threading.current_thread(), 'route', None) or '<unmatched>'
+        histogram = _requests.get(route)
+        if histogram is None:
+            with _lock:
+                histogram = _requests.setdefault(route, Histogram(REQUEST_BUCKETS))
+        histogram.observe(time.monotonic() - start)
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{%s}' % ','.join(f'{key}="{value}"' for key, value in escaped)
+
+
+class Exposition:
+    """ Builder of the text exposition of metrics. """
+    def __init__(self, prefix='inphms_'):
+        self.prefix = prefix
+        self.lines = []
+
+    def metric(self, name, kind, description, samples):
+        """ Add a counter or a gauge.
+
+        :param str kind: ``'counter'`` or ``'gauge'``
+        :param samples: an iterable of pairs ``(labels, value)``
+        """
+        name = self.prefix + name
+        self.lines.append(f'# HELP {name} {description}')
+        self.lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            self.lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    def histogram(self, name, description, histograms):
+        """ Add a histogram.
+
+        :param histograms: an iterable of pairs ``(labels, Histogram)``
+        """
+        name = self.prefix + name
+        self.lines.append(f'# HELP {name} {description}')
+        self.lines.append(f'# TYPE {name} histogram')
+        for labels, histogram in histograms:
+            for bound, count in histogram.buckets():
+                bucket_labels = dict(labels, le=_format_value(float(bound)))
+                self.lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {count}')
+            self.lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+            self.lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+
+    def render(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def render():
+    """ Return the metrics of the process in the text exposition format. """
+    from inphms.addons.base.models.ir_cron import cron_stats  # noqa: PLC0415
+    from inphms.service import server  # noqa: PLC0415
+
+    exposition = Exposition()
+
+    # HTTP requests
+    with _lock:
+        requests = sorted(_requests.items())
+    exposition.histogram('http_request_duration_seconds', "Duration of the HTTP requests per route.",
+                         (({'route': route}, histogram) for route, histogram in requests))
+    httpd = getattr(server.server, 'httpd', None)
+    if hasattr(httpd, 'http_stats'):
+        stats = httpd.http_stats()
+        exposition.metric('http_threads', 'gauge', "Threads of the HTTP pool.", [({}, stats['threads'])])
+        exposition.metric('http_threads_active', 'gauge', "Threads of the HTTP pool processing a request.",
+                          [({}, stats['threads_active'])])
+        exposition.metric('http_requests_queued', 'gauge', "HTTP requests waiting for a thread.",
+                          [({}, stats['queued'])])
+        exposition.metric('http_requests_total', 'counter', "HTTP requests handed over to the pool.",
+                          [({}, stats['requests'])])
+        exposition.metric('http_requests_rejected_total', 'counter', "HTTP requests rejected as the queue was full.",
+                          [({}, stats['requests_rejected'])])
+        exposition.metric('http_queue_seconds_total', 'counter', "Time spent by the HTTP requests in the queue.",
+                          [({}, stats['queue_time_total'])])
+    watchdog = getattr(server.server, 'watchdog', None)
+    if watchdog:
+        stats = watchdog.stats()
+        exposition.metric('process_rss_bytes', 'gauge', "Resident set size of the process.", [({}, stats['rss'])])
+        exposition.metric('process_pss_bytes', 'gauge', "Proportional set size of the process.", [({}, stats['pss'])])
+
+    # SQL
+    exposition.metric('sql_queries_total', 'counter', "Queries executed by the process.",
+                      [({}, sql_db.sql_counter)])
+    exposition.metric('sql_query_seconds_total', 'counter', "Time spent executing queries.",
+                      [({}, sql_db.sql_time)])
+    pools = [(pool, 'read-only' if pool.readonly else 'read/write')
+             for pool in (sql_db._Pool, sql_db._Pool_readonly) if pool is not None]
+    exposition.metric('db_connections', 'gauge', "Connections of the pools, per state.", [
+        ({'pool': mode, 'state': state}, value)
+        for pool, mode in pools
+        for state, value in pool.stats().items()
+    ])
+
+    # ormcache
+    caches = defaultdict(lambda: [0, 0, 0, 0, 0.0, 0.0])
+    for (dbname, _model, _method), counter in list(STAT.items()):
+        stats = caches[dbname, counter.cache_name or 'default']
+        stats[0] += counter.hit
+        stats[1] += counter.miss
+        stats[2] += counter.err
+        stats[3] += counter.coalesced
+        stats[4] += counter.coalesced_time
+        stats[5] += counter.gen_time
+    caches = sorted(caches.items())
+    for index, (name, description) in enumerate([
+        ('ormcache_hits_total', "Lookups of the ormcache finding their value."),
+        ('ormcache_misses_total', "Lookups of the ormcache computing their value."),
+        ('ormcache_errors_total', "Lookups of the ormcache with an unhashable key."),
+        ('ormcache_coalesced_total', "Lookups of the ormcache waiting for the value computed by another thread."),
+        ('ormcache_coalesced_seconds_total', "Time spent waiting for the values computed by other threads."),
+        ('ormcache_generation_seconds_total', "Time spent computing the values of the ormcache."),
+    ]):
+        exposition.metric(name, 'counter', description, [
+            ({'db': dbname, 'cache': cache_name}, stats[index])
+            for (dbname, cache_name), stats in caches
+        ])
+    with Registry.registries._lock:
+        registries = sorted(Registry.registries.d.items(), key=lambda item: item[0])
+    lrus = [
+        ({'db': dbname, 'cache': cache_name}, lru)
+        for dbname, registry in registries
+        for cache_name, lru in registry._Registry__caches.items()
+    ]
+    exposition.metric('ormcache_entries', 'gauge', "Entries of the ormcache.",
+                      ((labels, len(lru)) for labels, lru in lrus))
+    exposition.metric('ormcache_evictions_total', 'counter', "Entries evicted from the ormcache.",
+                      ((labels, lru.evictions) for labels, lru in lrus))
+
+    # registries
+    footprints = Registry.memory_footprints()
+    exposition.metric('registries', 'gauge', "Registries loaded in the process.", [({}, len(footprints))])
+    exposition.metric('registry_memory_bytes', 'gauge', "Measured memory footprint of the registries.",
+                      (({'db': dbname}, size) for dbname, size in sorted(footprints.items())))
+
+    # cron jobs
+    exposition.histogram('cron_lateness_seconds', "Delay between the nextcall of the cron jobs and their start.",
+                         [({}, cron_stats.lateness)])
+    exposition.histogram('cron_duration_seconds', "Duration of the cron jobs.",
+                         [({}, cron_stats.duration)])
+    exposition.histogram('cron_queries', "Queries executed by the cron jobs.",
+                         [({}, cron_stats.queries)])
+    exposition.metric('cron_failure_transitions_total', 'counter',
+                      "Cron jobs which started failing, recovered or were deactivated.",
+                      (({'transition': transition}, count)
+                       for transition, count in sorted(cron_stats.to_dict()['transitions'].items())))
+
+    return exposition.render()
@@ -86,6 +86,8 @@ def retrying(func, env):
     try:
         for tryno in range(1, MAX_TRIES_ON_CONCURRENCY_FAILURE + 1):
             tryleft = MAX_TRIES_ON_CONCURRENCY_FAILURE - tryno
+            if hasattr(env.cr, 'reset_query_budget'):
+                env.cr.reset_query_budget()
             try:
                 result = func()
                 if not env.cr._closed:
@@ -3,12 +3,17 @@
 #-----------------------------------------------------------
 # Threaded, Gevent and Prefork Servers
 #-----------------------------------------------------------
+import ctypes
 import datetime
 import errno
+import gc
+import heapq
+import itertools
 import logging
 import os
 import os.path
 import platform
+import queue
 import random
 import select
 import signal
@@ -48,6 +53,12 @@ if not inotify:
     except ImportError:
         watchdog = None
 
+# Optional asyncio server
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
 # Optional process names for workers
 try:
     from setproctitle import setproctitle
@@ -58,14 +69,15 @@ import inphms
 from inphms.modules import get_modules
 from inphms.modules.registry import Registry
 from inphms.release import nt_service_name
-from inphms.tools import config
-# from inphms.tools.cache import log_ormcache_stats
-# from inphms.tools.misc import stripped_sys_argv, dumpstacks
-from inphms.tools.misc import dumpstacks
+from inphms.tools import config, memtrace
+from inphms.tools.cache import log_ormcache_stats
+from inphms.tools.misc import stripped_sys_argv, dumpstacks
 
 _logger = logging.getLogger(__name__)
 
 SLEEP_INTERVAL = 60
+# the threads of the HTTP pool idle for that long exit
+HTTP_THREAD_IDLE_TIMEOUT = 60
 
 def set_limit_memory_hard(): #ichecked
     if platform.system() != 'Linux':
@@ -85,6 +97,7 @@ def start(preload=None, stop=False):
     global server
 
     load_server_wide_modules()
+    memtrace.start()
     if inphms.evented:
         server = GeventServer(inphms.http.root)
     elif config['workers']:
@@ -115,7 +128,12 @@ def start(preload=None, stop=False):
                 assert libc.mallopt(ctypes.c_int(M_ARENA_MAX), ctypes.c_int(2))
             except Exception:
                 _logger.warning("Could not set ARENA_MAX through mallopt()")
-        server = ThreadedServer(inphms.http.root)
+        if config['asgi'] and not uvicorn:
+            _logger.warning("The ASGI server requires uvicorn, falling back on the threaded server.")
+        if config['asgi'] and uvicorn:
+            server = AsgiServer(inphms.http.root)
+        else:
+            server = ThreadedServer(inphms.http.root)
 
     watcher = None
     if 'reload' in config['dev_mode'] and not inphms.evented:
@@ -164,67 +182,112 @@ Maybe you forgot to add those addons in your addons_path configuration."""
             _logger.exception('Failed to load server-wide module `%s`.%s', m, msg)
 
 def preload_registries(dbnames):
-    """ Preload a registries, possibly run a test file."""
+    """ Preload a registries, possibly run a test file.
+
+    A database failing to load does not prevent the next ones from being
+    loaded, the failure is reported in the return code instead. Registries
+    are loaded one after the other, as :meth:`Registry.new` is serialized.
+    """
     # TODO: move all config checks to args dont check tools.config here
     dbnames = dbnames or []
     rc = 0
-    print("preload registries", dbnames)
-    for dbname in dbnames:
+    failed = []
+    t0 = time.time()
+    for index, dbname in enumerate(dbnames, start=1):
+        t1 = time.time()
         try:
-            update_module = config['init'] or config['update']
-            threading.current_thread().dbname = dbname
-            registry = Registry.new(dbname, update_module=update_module)
-
-            # run test_file if provided
-            if config['test_file']:
-                test_file = config['test_file']
-                if not os.path.isfile(test_file):
-                    _logger.warning('test file %s cannot be found', test_file)
-                elif not test_file.endswith('py'):
-                    _logger.warning('test file %s is not a python file', test_file)
-                else:
-                    _logger.info('loading test file %s', test_file)
-                    load_test_file_py(registry, test_file)
-
-            # run post-install tests
-            if config['test_enable']:
-                from inphms.tests import loader  # noqa: PLC0415
-                t0 = time.time()
-                t0_sql = inphms.sql_db.sql_counter
-                module_names = (registry.updated_modules if update_module else
-                                sorted(registry._init_modules))
-                _logger.info("Starting post tests")
-                tests_before = registry._assertion_report.testsRun
-                post_install_suite = loader.make_suite(module_names, 'post_install')
-                if post_install_suite.has_http_case():
-                    with registry.cursor() as cr:
-                        env = inphms.api.Environment(cr, inphms.SUPERUSER_ID, {})
-                        env['ir.qweb']._pregenerate_assets_bundles()
-                result = loader.run_suite(post_install_suite, global_report=registry._assertion_report)
-                registry._assertion_report.update(result)
-                _logger.info("%d post-tests in %.2fs, %s queries",
-                             registry._assertion_report.testsRun - tests_before,
-                             time.time() - t0,
-                             inphms.sql_db.sql_counter - t0_sql)
-
-                registry._assertion_report.log_stats()
-            if registry._assertion_report and not registry._assertion_report.wasSuccessful():
-                rc += 1
+            rc += _preload_registry(dbname)
         except Exception:
             _logger.critical('Failed to initialize database `%s`.', dbname, exc_info=True)
-            return -1
+            failed.append(dbname)
+            continue
+        finally:
+            threading.current_thread().dbname = None
+        if len(dbnames) > 1:
+            _logger.info("Preloaded registry of %s (%d/%d) in %.3fs", dbname, index, len(dbnames), time.time() - t1)
+    if len(dbnames) > 1:
+        _logger.info("Preloaded %d registries in %.3fs", len(dbnames) - len(failed), time.time() - t0)
+    if failed:
+        _logger.critical("Failed to initialize %d database(s): %s", len(failed), ', '.join(failed))
+        return -1
     return rc
 
+def _preload_registry(dbname):
+    """ Load the registry of the given database, and run the test file and the
+    post-install tests if requested. Return 1 if tests failed, 0 otherwise. """
+    update_module = config['init'] or config['update']
+    threading.current_thread().dbname = dbname
+    registry = Registry.new(dbname, update_module=update_module)
+
+    # run test_file if provided
+    if config['test_file']:
+        test_file = config['test_file']
+        if not os.path.isfile(test_file):
+            _logger.warning('test file %s cannot be found', test_file)
+        elif not test_file.endswith('py'):
+            _logger.warning('test file %s is not a python file', test_file)
+        else:
+            _logger.info('loading test file %s', test_file)
+            load_test_file_py(registry, test_file)
+
+    # run post-install tests
+    if config['test_enable']:
+        from inphms.tests import loader  # noqa: PLC0415
+        t0 = time.time()
+        t0_sql = inphms.sql_db.sql_counter
+        module_names = (registry.updated_modules if update_module else
+                        sorted(registry._init_modules))
+        _logger.info("Starting post tests")
+        tests_before = registry._assertion_report.testsRun
+        post_install_suite = loader.make_suite(module_names, 'post_install')
+        if post_install_suite.has_http_case():
+            with registry.cursor() as cr:
+                env = inphms.api.Environment(cr, inphms.SUPERUSER_ID, {})
+                env['ir.qweb']._pregenerate_assets_bundles()
+        result = loader.run_suite(post_install_suite, global_report=registry._assertion_report)
+        registry._assertion_report.update(result)
+        _logger.info("%d post-tests in %.2fs, %s queries",
+                     registry._assertion_report.testsRun - tests_before,
+                     time.time() - t0,
+                     inphms.sql_db.sql_counter - t0_sql)
+
+        registry._assertion_report.log_stats()
+    if registry._assertion_report and not registry._assertion_report.wasSuccessful():
+        return 1
+    return 0
+
 def memory_info(process): #ichecked
     """
-    :return: the relevant memory usage according to the OS in bytes.
+    :return: the memory usage checked against ``limit_memory_soft``, i.e. the
+        resident set size, in bytes. The virtual memory is bounded by
+        ``limit_memory_hard`` instead, see :func:`set_limit_memory_hard`.
     """
     # psutil < 2.0 does not have memory_info, >= 3.0 does not have get_memory_info
     pmem = (getattr(process, 'memory_info', None) or process.get_memory_info)()
-    # MacOSX allocates very large vms to all processes so we only monitor the rss usage.
-    if platform.system() == 'Darwin':
-        return pmem.rss
-    return pmem.vms
+    return pmem.rss
+
+def empty_pipe(fd):
+    try:
+        while os.read(fd, 1):
+            pass
+    except OSError as e:
+        if e.errno not in [errno.EAGAIN]:
+            raise
+
+def _reexec_args(updated_modules=None):
+    """arguments to reexecute inphms-bin process with (nearly) the same arguments"""
+    exe = os.path.basename(sys.executable)
+    args = stripped_sys_argv()
+    if updated_modules:
+        args += ["-u", ','.join(updated_modules)]
+    if not args or args[0] != exe:
+        args.insert(0, exe)
+    return args
+
+def _reexec(updated_modules=None):
+    """reexecute inphms-bin process with (nearly) the same arguments"""
+    # We should keep the LISTEN_* environment variabled in order to support socket activation on reexec
+    os.execve(sys.executable, _reexec_args(updated_modules), os.environ)
 
 # DONE
 class CommonServer(object): #ichecked
@@ -271,6 +334,241 @@ class CommonServer(object): #ichecked
                 raise
         sock.close()
 
+
+class CronQueue:
+    """ Databases whose scheduled actions have to be processed, ordered by the
+    time their next job is due. The queue is shared by the cron threads of a
+    process, and a due database is handed over to a single thread. When the
+    database has more due jobs, :meth:`ir_cron._process_jobs` notifies the
+    workers again, and another thread picks it up to run them concurrently.
+
+    The cron workers are woken up by a ``cron_trigger`` notification whose
+    payload is the name of the database, which makes it due immediately.
+    Otherwise a database is processed again when its next job is due, or
+    after ``SLEEP_INTERVAL`` seconds at the latest, as jobs may be created or
+    rescheduled without notification. The databases are no longer polled at
+    every wake-up of a worker.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.heap = []          # [(due time, dbname)], with outdated entries
+        self.due = {}           # {dbname: due time} of the queued databases
+        self.known = set()
+
+    def push(self, dbname, delay=0):
+        """ Make the database due in ``delay`` seconds, unless it is already
+        due sooner. """
+        when = time.monotonic() + delay
+        with self.lock:
+            self.known.add(dbname)
+            if when < self.due.get(dbname, float('inf')):
+                self.due[dbname] = when
+                heapq.heappush(self.heap, (when, dbname))
+
+    def discover(self, dbnames):
+        """ Synchronize the queue with the given databases: the new ones are
+        due immediately, the missing ones are forgotten. """
+        dbnames = set(dbnames)
+        for dbname in dbnames - self.known:
+            self.push(dbname)
+        with self.lock:
+            for dbname in self.known - dbnames:
+                self.known.discard(dbname)
+                self.due.pop(dbname, None)
+
+    def pop(self):
+        """ Return the name of a due database, or ``None`` if there is none.
+        The caller must call :meth:`done` once done with it. """
+        now = time.monotonic()
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                when, dbname = heapq.heappop(self.heap)
+                if self.due.get(dbname) == when:
+                    del self.due[dbname]
+                    return dbname
+        return None
+
+    def done(self, dbname, delay):
+        """ Release the database, due again in ``delay`` seconds; a delay of
+        ``None`` means the database has no job to wait for. """
+        # jobs may be added or rescheduled without notification
+        self.push(dbname, SLEEP_INTERVAL if delay is None else min(delay, SLEEP_INTERVAL))
+
+    def timeout(self):
+        """ Return the number of seconds until the next database is due. """
+        with self.lock:
+            while self.heap and self.due.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                return float('inf')
+            return max(self.heap[0][0] - time.monotonic(), 0)
+
+    def notified(self, pg_conn, dbnames):
+        """ Make due the databases notified on ``pg_conn``; a notification
+        without payload makes all the given databases due. """
+        for notify in pg_conn.notifies:
+            for dbname in ([notify.payload] if notify.payload else dbnames):
+                self.push(dbname)
+        pg_conn.notifies.clear()
+
+
+class LimitTimeRealExceeded(Exception):
+    """ Raised in a thread whose request or cron job exceeded the real time
+    limit, see :class:`Watchdog`. """
+
+
+class Watchdog(threading.Thread):
+    """ Enforce the limits of the threaded server: the real time limit of the
+    HTTP requests and cron jobs, and the soft memory limit of the process.
+
+    The threads register the request they start with :meth:`watch`, which
+    gives it an id, and clear that id with :meth:`release` once the request
+    is over. The watchdog keeps the deadlines of the requests in a heap, so
+    that it wakes up when the earliest one expires instead of enumerating the
+    threads periodically. A request exceeding its deadline is cancelled in
+    steps, as long as the thread still processes that same request:
+
+    * the thread is flagged with ``request_cancelled``, which makes its next
+      queries fail, and the queries running on its cursors are cancelled;
+    * after ``CANCEL_GRACE`` seconds, :class:`LimitTimeRealExceeded` is
+      raised asynchronously in the thread, as a last resort;
+    * after ``CANCEL_TIMEOUT`` more seconds, the thread is considered stuck
+      and the server is reloaded.
+
+    The id is checked and cleared under the same lock, so that the request of
+    a thread is only cancelled while it is still running.
+
+    The RSS of the process is sampled every ``limit_check_interval`` seconds,
+    and checked against ``limit_memory_soft``; the PSS, which accounts for
+    the memory shared with other processes, is sampled less often as it is
+    more expensive to compute.
+    """
+    # sampling interval of the PSS
+    PSS_INTERVAL = 30
+    # delay given to a cancelled request to stop by itself
+    CANCEL_GRACE = 5
+    # delay after which a cancelled thread is considered stuck
+    CANCEL_TIMEOUT = SLEEP_INTERVAL
+
+    # steps of the cancellation of a request
+    EXPIRED, INTERRUPT, STUCK = range(3)
+
+    def __init__(self, server):
+        super().__init__(name='inphms.service.watchdog', daemon=True)
+        self.server = server
+        self.interval = config['limit_check_interval'] or 1
+        self.process = psutil.Process()
+        self.cond = threading.Condition()
+        self.heap = []          # [(deadline, request id, step, start_time, thread)]
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()    # protects the request ids of the threads
+        self.cancelled = {}     # {thread: request id}
+        self.rss = 0
+        self.pss = None
+        self.pss_time = 0
+
+    @staticmethod
+    def limit_time_real(thread):
+        if (getattr(thread, 'type', None) == 'cron' and
+                config['limit_time_real_cron'] and config['limit_time_real_cron'] > 0):
+            return config['limit_time_real_cron']
+        return config['limit_time_real']
+
+    def watch(self, thread):
+        """ Watch the request that ``thread`` started at ``thread.start_time``.
+        The thread must call :meth:`release` once the request is over. """
+        thread.watchdog_id = request_id = next(self.ids)
+        thread.request_cancelled = False
+        start_time = getattr(thread, 'start_time', None)
+        limit = self.limit_time_real(thread)
+        if not start_time or not limit or limit <= 0:
+            return
+        self.schedule(start_time + limit, request_id, self.EXPIRED, start_time, thread)
+
+    def release(self, thread):
+        """ Mark the request of ``thread`` as over, it can no longer be
+        cancelled afterwards. """
+        with self.lock:
+            thread.watchdog_id = None
+            thread.request_cancelled = False
+
+    def schedule(self, deadline, request_id, step, start_time, thread):
+        with self.cond:
+            heapq.heappush(self.heap, (deadline, request_id, step, start_time, thread))
+            if self.heap[0][1] == request_id:
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                timeout = self.interval
+                if self.heap:
+                    timeout = min(timeout, max(self.heap[0][0] - time.time(), 0))
+                self.cond.wait(timeout)
+                now = time.time()
+                expired = []
+                while self.heap and self.heap[0][0] <= now:
+                    expired.append(heapq.heappop(self.heap))
+            try:
+                for _deadline, request_id, step, start_time, thread in expired:
+                    self.expire(thread, request_id, step, start_time, now)
+                self.check_memory(now)
+            except Exception:
+                _logger.exception("Watchdog failure")
+
+    def expire(self, thread, request_id, step, start_time, now):
+        with self.lock:
+            if (getattr(thread, 'watchdog_id', None) != request_id or not thread.is_alive()
+                    or getattr(thread, 'type', None) == 'websocket'):
+                # the request is over, or a websocket request without limit
+                self.cancelled.pop(thread, None)
+                return
+            if step == self.EXPIRED:
+                _logger.warning('Thread %s real time limit (%d/%ds) reached, cancelling its request.',
+                                thread, now - start_time, self.limit_time_real(thread))
+                thread.request_cancelled = True
+                inphms.sql_db.cancel_queries(thread)
+                self.cancelled[thread] = request_id
+            elif step == self.INTERRUPT:
+                _logger.warning('Thread %s did not stop after the cancellation of its request, interrupting it.', thread)
+                dumpstacks(thread_idents=[thread.ident])
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                    ctypes.c_ulong(thread.ident), ctypes.py_object(LimitTimeRealExceeded))
+                # the exception is only raised once the thread runs Python code
+                inphms.sql_db.cancel_queries(thread)
+            else:
+                _logger.warning('Thread %s is stuck since its request was cancelled.', thread)
+                del self.cancelled[thread]
+                self.server.limits_reached_threads.add(thread)
+                self.server.limit_event.set()
+                return
+        delay = self.CANCEL_GRACE if step == self.EXPIRED else self.CANCEL_TIMEOUT
+        self.schedule(now + delay, request_id, step + 1, start_time, thread)
+
+    def check_memory(self, now):
+        self.rss = memory_info(self.process)
+        if now - self.pss_time >= self.PSS_INTERVAL:
+            self.pss_time = now
+            try:
+                self.pss = self.process.memory_full_info().pss
+            except (AttributeError, psutil.Error):
+                # PSS is only available on Linux
+                self.pss = None
+        main_thread = threading.main_thread()
+        if (config['limit_memory_soft'] and self.rss > config['limit_memory_soft']
+                and main_thread not in self.server.limits_reached_threads):
+            _logger.warning('Server memory limit (%s) reached.', self.rss)
+            memtrace.log_top(logging.WARNING)
+            self.server.limits_reached_threads.add(main_thread)
+            self.server.limit_event.set()
+
+    def stats(self):
+        """ Return the memory usage and the number of watched requests. """
+        with self.cond:
+            watched = len(self.heap)
+        return {'rss': self.rss, 'pss': self.pss, 'watched': watched, 'cancelled': len(self.cancelled)}
+
+
 class ThreadedServer(CommonServer):
     def __init__(self, app): #ichecked
         super().__init__(app)
@@ -281,8 +579,14 @@ class ThreadedServer(CommonServer):
 
         #self.socket = None
         self.httpd = None
+        self.watchdog = None
         self.limits_reached_threads = set()
         self.limit_reached_time = None
+        self.limit_event = threading.Event()
+        # graceful reload, see spawn_successor()
+        self.successor_pid = None
+        self.successor_pipe = None
+        self.draining = False
 
     def run(self, preload=None, stop=False): #ichecked
         """ Start the http server and the cron thread then wait for a signal.
@@ -290,10 +594,21 @@ class ThreadedServer(CommonServer):
         The first SIGINT or SIGTERM signal will initiate a graceful shutdown while
         a second one if any will force an immediate exit.
         """
+        # on a graceful reload, warm the registries the previous process had
+        preload = list(preload or [])
+        preload += [
+            dbname
+            for dbname in os.environ.pop('INPHMS_RELOAD_DATABASES', '').split(',')
+            if dbname and dbname not in preload
+        ]
         with Registry._lock:
             self.start(stop=stop)
             rc = preload_registries(preload)
-        
+
+        # serve the requests once the registries are warm
+        if config['http_enable'] and not stop and not self.httpd:
+            self.http_spawn()
+
         if stop:
             if config['test_enable']:
                 from inphms.tests.result import _logger as logger  # noqa: PLC0415
@@ -308,6 +623,7 @@ class ThreadedServer(CommonServer):
             return rc
 
         self.cron_spawn()
+        self.notify_predecessor()
 
         # Wait for a first signal to be handled. (time.sleep will be interrupted
         # by the signal handler)
@@ -317,6 +633,7 @@ class ThreadedServer(CommonServer):
                 if self.limit_reached_time:
                     has_other_valid_requests = any(
                         not t.daemon and
+                        getattr(t, 'start_time', None) and
                         t not in self.limits_reached_threads
                         for t in threading.enumerate()
                         if getattr(t, 'type', None) == 'http')
@@ -336,7 +653,9 @@ class ThreadedServer(CommonServer):
                     else:
                         time.sleep(1)
                 else:
-                    time.sleep(SLEEP_INTERVAL)
+                    # woken up by the watchdog when a limit is reached
+                    self.limit_event.wait(SLEEP_INTERVAL)
+                    self.limit_event.clear()
         except KeyboardInterrupt:
             pass
 
@@ -353,13 +672,18 @@ class ThreadedServer(CommonServer):
             signal.signal(signal.SIGXCPU, self.signal_handler) # Signal CPU Time Limit Exceeded
             signal.signal(signal.SIGQUIT, dumpstacks) # Signal Quit, `kill -QUIT` command or CTRL + \
             signal.signal(signal.SIGUSR1, log_ormcache_stats) # Signal User 1, `kill -USR1 <pid>` command
+            signal.signal(signal.SIGUSR2, self.signal_handler) # Signal User 2, graceful reload
         elif os.name == 'nt':
             import win32api
             win32api.SetConsoleCtrlHandler(lambda sig: self.signal_handler(sig, None), 1)
         
-        test_mode = config['test_enable'] or config['test_file']
-        if test_mode or (config['http_enable'] and not stop):
-            # some tests need the http daemon to be available...
+        if os.name == 'posix':
+            self.watchdog = Watchdog(self)
+            self.watchdog.start()
+
+        if config['test_enable'] or config['test_file']:
+            # some tests need the http daemon to be available while the
+            # registries are loaded, it is started after them otherwise
             self.http_spawn()
     
     def stop(self): #ichecked
@@ -367,11 +691,16 @@ class ThreadedServer(CommonServer):
         """
         if server_phoenix:
             _logger.info("Initiating server reload")
+        elif self.draining:
+            _logger.info("Process %s took over, finishing the pending requests", self.successor_pid)
         else:
             _logger.info("Initiating shutdown")
             _logger.info("Hit CTRL-C again or send a second signal to force the shutdown.")
 
         stop_time = time.time()
+        # the pending requests of a graceful reload may take up to the
+        # real time limit, the successor serves the new ones meanwhile
+        stop_timeout = max(config['limit_time_real'], 1) if self.draining else 1
 
         if self.httpd:
             self.httpd.shutdown()
@@ -387,7 +716,7 @@ class ThreadedServer(CommonServer):
             _logger.debug('process %r (%r)', thread, thread.daemon)
             if (thread != me and not thread.daemon and thread.ident != self.main_thread_id and
                     thread not in self.limits_reached_threads):
-                while thread.is_alive() and (time.time() - stop_time) < 1:
+                while thread.is_alive() and (time.time() - stop_time) < stop_timeout:
                     # We wait for requests to finish, up to 1 second.
                     _logger.debug('join and sleep')
                     # Need a busyloop here as thread.join() masks signals
@@ -402,9 +731,87 @@ class ThreadedServer(CommonServer):
     
     def reload(self): #ichecked
         os.kill(self.pid, signal.SIGHUP)
+
+    def spawn_successor(self):
+        """ Start a graceful reload: spawn a new server process inheriting the
+        listening socket (see ``ThreadedWSGIServerReloadable.server_bind``).
+        The new process loads the registries of this one and starts serving,
+        then writes to the pipe given as fd 4 and notifies this process with
+        SIGUSR2, upon which this one stops accepting connections, finishes its
+        pending requests and exits.
+
+        The process is spawned with :func:`os.posix_spawn`, as running Python
+        code between a fork and an exec is unsafe in a multithreaded process.
+        """
+        sock = getattr(self.httpd, 'socket', None)
+        if os.name != 'posix' or sock is None:
+            _logger.warning("Graceful reload requires the threaded HTTP server on a POSIX system, ignored")
+            return
+        if self.successor_pid:
+            _logger.warning("Graceful reload already in progress (process %s), ignored", self.successor_pid)
+            return
+        with Registry.registries._lock:
+            dbnames = ','.join(Registry.registries.d)
+        SD_LISTEN_FDS_START = 3
+        NOTIFY_FD = SD_LISTEN_FDS_START + 1
+        env = dict(
+            os.environ,
+            LISTEN_FDS='1',
+            INPHMS_RELOAD_PREDECESSOR=str(self.pid),
+            INPHMS_RELOAD_DATABASES=dbnames,
+            INPHMS_RELOAD_NOTIFY_FD=str(NOTIFY_FD),
+        )
+        # the pid of the new process is only known once it runs
+        env.pop('LISTEN_PID', None)
+        read_fd, write_fd = os.pipe()
+        # copies above the target fds, which dup2() cannot clobber
+        fds = [fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, NOTIFY_FD + 1) for fd in (sock.fileno(), write_fd)]
+        try:
+            pid = os.posix_spawn(sys.executable, _reexec_args(), env, file_actions=[
+                (os.POSIX_SPAWN_DUP2, fds[0], SD_LISTEN_FDS_START),
+                (os.POSIX_SPAWN_DUP2, fds[1], NOTIFY_FD),
+            ])
+        except OSError:
+            _logger.exception("Graceful reload failed: cannot spawn the new process")
+            os.close(read_fd)
+            return
+        finally:
+            for fd in (write_fd, *fds):
+                os.close(fd)
+        os.set_blocking(read_fd, False)
+        self.successor_pid = pid
+        self.successor_pipe = read_fd
+        _logger.info("Graceful reload: process %s is starting", pid)
+
+    def successor_ready(self):
+        """ Return whether the process spawned by :meth:`spawn_successor` has
+        written to its pipe that it serves the requests. """
+        try:
+            return os.read(self.successor_pipe, 16) == b'ready'
+        except BlockingIOError:
+            return False
+
+    def successor_failed(self):
+        os.close(self.successor_pipe)
+        self.successor_pid = self.successor_pipe = None
+
+    def notify_predecessor(self):
+        """ Tell the process that spawned this one for a graceful reload that
+        this process is ready to serve the requests. """
+        predecessor = os.environ.pop('INPHMS_RELOAD_PREDECESSOR', None)
+        notify_fd = os.environ.pop('INPHMS_RELOAD_NOTIFY_FD', None)
+        if not predecessor or not notify_fd:
+            return
+        try:
+            if int(predecessor) == os.getppid():
+                os.write(int(notify_fd), b'ready')
+                os.kill(int(predecessor), signal.SIGUSR2)
+        finally:
+            os.close(int(notify_fd))
     
     def http_spawn(self): #ichecked
         self.httpd = ThreadedWSGIServerReloadable(self.interface, self.port, self.app)
+        self.httpd.watchdog = self.watchdog
         threading.Thread(
             target=self.httpd.serve_forever,
             name="inphms.service.httpd",
@@ -423,6 +830,7 @@ class ThreadedServer(CommonServer):
         # to prevent time.strptime AttributeError within the thread.
         # See: http://bugs.python.org/issue7980
         datetime.datetime.strptime('2012-01-01', '%Y-%m-%d')
+        self.cron_queue = CronQueue()
         for i in range(inphms.tools.config['max_cron_threads']):
             def target():
                 self.cron_thread(i)
@@ -445,7 +853,7 @@ class ThreadedServer(CommonServer):
         # just a bit prevents they all poll the database at the exact
         # same time. This is known as the thundering herd effect.
 
-        from inphms.addons.base.models.ir_cron import ir_cron
+        from inphms.addons.base.models.ir_cron import ir_cron, cron_stats
         def _run_cron(cr): #ichecked
             pg_conn = cr._cnx
             # LISTEN / NOTIFY doesn't work in recovery mode
@@ -458,21 +866,43 @@ class ThreadedServer(CommonServer):
             cr.commit()
             alive_time = time.monotonic()
             while config['limit_time_worker_cron'] <= 0 or (time.monotonic() - alive_time) <= config['limit_time_worker_cron']:
-                select.select([pg_conn], [], [], SLEEP_INTERVAL + number)
-                time.sleep(number / 100)
-                pg_conn.poll()
-
-                registries = inphms.modules.registry.Registry.registries
-                _logger.debug('cron%d polling for jobs', number)
-                for db_name, registry in registries.d.items():
-                    if registry.ready:
-                        thread = threading.current_thread()
-                        thread.start_time = time.time()
+                try:
+                    select.select([pg_conn], [], [], min(SLEEP_INTERVAL + number, self.cron_queue.timeout()))
+                    time.sleep(number / 100)
+                    pg_conn.poll()
+
+                    registries = inphms.modules.registry.Registry.registries
+                    ready = [db_name for db_name, registry in registries.d.items() if registry.ready]
+                    self.cron_queue.discover(ready)
+                    self.cron_queue.notified(pg_conn, ready)
+                    _logger.debug('cron%d polling for jobs', number)
+                    while db_name := self.cron_queue.pop():
+                        delay = None
                         try:
-                            ir_cron._process_jobs(db_name)
-                        except Exception:
-                            _logger.warning('cron%d encountered an Exception:', number, exc_info=True)
-                        thread.start_time = None
+                            registry = registries.d.get(db_name)
+                            if not (registry and registry.ready):
+                                continue
+                            delay = SLEEP_INTERVAL
+                            thread = threading.current_thread()
+                            thread.start_time = time.time()
+                            if self.watchdog:
+                                self.watchdog.watch(thread)
+                            try:
+                                ir_cron._process_jobs(db_name)
+                                delay = ir_cron._get_next_job_delay(db_name)
+                            except Exception:
+                                _logger.warning('cron%d encountered an Exception:', number, exc_info=True)
+                            finally:
+                                if self.watchdog:
+                                    self.watchdog.release(thread)
+                                thread.start_time = None
+                        finally:
+                            self.cron_queue.done(db_name, delay)
+                    if number == 0:
+                        cron_stats.log()
+                except LimitTimeRealExceeded:
+                    # the cancellation reached the thread outside of the job
+                    _logger.warning('cron%d job cancelled after its processing', number)
         while True:
             conn = inphms.sql_db.db_connect('postgres')
             with contextlib.closing(conn.cursor()) as cr:
@@ -481,27 +911,8 @@ class ThreadedServer(CommonServer):
             _logger.info('cron%d max age (%ss) reached, releasing connection.', number, config['limit_time_worker_cron'])
         
     def process_limit(self): #ichecked
-        memory = memory_info(psutil.Process(os.getpid()))
-        if config['limit_memory_soft'] and memory > config['limit_memory_soft']:
-            _logger.warning('Server memory limit (%s) reached.', memory)
-            self.limits_reached_threads.add(threading.current_thread())
-
-        for thread in threading.enumerate():
-            thread_type = getattr(thread, 'type', None)
-            if not thread.daemon and thread_type != 'websocket' or thread_type == 'cron':
-                # We apply the limits on cron threads and HTTP requests,
-                # websocket requests excluded.
-                if getattr(thread, 'start_time', None):
-                    thread_execution_time = time.time() - thread.start_time
-                    thread_limit_time_real = config['limit_time_real']
-                    if (getattr(thread, 'type', None) == 'cron' and
-                            config['limit_time_real_cron'] and config['limit_time_real_cron'] > 0):
-                        thread_limit_time_real = config['limit_time_real_cron']
-                    if thread_limit_time_real and thread_execution_time > thread_limit_time_real:
-                        _logger.warning(
-                            'Thread %s virtual real time limit (%d/%ds) reached.',
-                            thread, thread_execution_time, thread_limit_time_real)
-                        self.limits_reached_threads.add(thread)
+        # The limits are detected by the watchdog, which adds the threads
+        # exceeding them to limits_reached_threads.
         # Clean-up threads that are no longer alive
         # e.g. threads that exceeded their real time,
         # but which finished before the server could restart.
@@ -534,6 +945,678 @@ class ThreadedServer(CommonServer):
             self.quit_signals_received += 1
             # interrupt run() to start shutdown
             raise KeyboardInterrupt()
+        elif sig == signal.SIGUSR2:
+            if not self.successor_pid:
+                # graceful reload on kill -USR2
+                self.spawn_successor()
+            elif self.draining:
+                pass
+            elif self.successor_ready():
+                # the successor is ready, leave it the listening socket
+                self.draining = True
+                self.quit_signals_received += 1
+                raise KeyboardInterrupt()
+            else:
+                _logger.warning("Graceful reload already in progress (process %s), ignored", self.successor_pid)
+        elif sig == signal.SIGCHLD and self.successor_pid and not self.draining:
+            pid, status = os.waitpid(self.successor_pid, os.WNOHANG)
+            if pid:
+                _logger.error("Graceful reload failed: process %s exited with status %s", pid, status)
+                self.successor_failed()
+
+
+class AsgiServer(ThreadedServer):
+    """ Threaded server whose HTTP requests are served by an asyncio event
+    loop, see :mod:`inphms.service.asgi`. Signals, cron threads and limits are
+    those of the threaded server.
+    """
+    def http_spawn(self):
+        from .asgi import ASGIApplication  # noqa: PLC0415
+        uvicorn_config = uvicorn.Config(
+            ASGIApplication(self.app, watchdog=self.watchdog),
+            host=self.interface or '0.0.0.0',
+            port=self.port,
+            lifespan='on',
+            log_config=None,
+            access_log=False,
+            proxy_headers=False,
+        )
+        self.httpd = uvicorn.Server(uvicorn_config)
+        # signals are handled by the threaded server in the main thread
+        self.httpd.install_signal_handlers = lambda: None
+        threading.Thread(
+            target=self.httpd.run,
+            name="inphms.service.asgi",
+            daemon=True,
+        ).start()
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.should_exit = True
+            self.httpd = None
+        super().stop()
+
+
+class GeventServer(CommonServer):
+    """ Evented server serving the long-polling and websocket requests on
+    ``--gevent-port``. Every connection runs in a greenlet, and the psycopg2
+    wait callback installed by :func:`~inphms._monkeypatches.evented.patch_evented`
+    lets the other greenlets run while one waits on the database.
+    """
+    def __init__(self, app):
+        super().__init__(app)
+        self.port = config['gevent_port']
+        self.httpd = None
+
+    def process_limits(self):
+        restart = False
+        if self.ppid != os.getppid():
+            _logger.warning("Gevent Parent changed: %s", self.pid)
+            restart = True
+        memory = memory_info(psutil.Process(self.pid))
+        limit_memory_soft = config['limit_memory_soft_gevent'] or config['limit_memory_soft']
+        if limit_memory_soft and memory > limit_memory_soft:
+            _logger.warning('Gevent memory limit (RSS) reached: %s', memory)
+            memtrace.log_top(logging.WARNING)
+            restart = True
+        if restart:
+            # suicide !!
+            os.kill(self.pid, signal.SIGTERM)
+
+    def watchdog(self, beat=4):
+        import gevent  # noqa: PLC0415
+        self.ppid = os.getppid()
+        while True:
+            self.process_limits()
+            gevent.sleep(beat)
+
+    def start(self):
+        import gevent  # noqa: PLC0415
+        from gevent.pywsgi import WSGIServer, WSGIHandler  # noqa: PLC0415
+
+        class ProxyHandler(WSGIHandler):
+            """ When logging requests, try to get the client address from
+            the environment so we get proxyfix's modifications (if any).
+
+            Derived from werzeug.serving.WSGIRequestHandler.log
+            / werzeug.serving.WSGIRequestHandler.address_string
+            """
+            def _connection_upgrade_requested(self):
+                if self.headers.get('Connection', '').lower() == 'upgrade':
+                    return True
+                if self.headers.get('Upgrade', '').lower() == 'websocket':
+                    return True
+                return False
+
+            def format_request(self):
+                old_address = self.client_address
+                if getattr(self, 'environ', None):
+                    self.client_address = self.environ['REMOTE_ADDR']
+                elif not self.client_address:
+                    self.client_address = '<local>'
+                # other cases are handled inside WSGIHandler
+                try:
+                    return super().format_request()
+                finally:
+                    self.client_address = old_address
+
+            def finalize_headers(self):
+                # We need to make gevent.pywsgi stop dealing with chunks when the connection
+                # Is being upgraded. see https://github.com/gevent/gevent/issues/1712
+                super().finalize_headers()
+                if self.code == 101:
+                    # Switching Protocols. Disable chunked writes.
+                    self.response_use_chunked = False
+
+            def get_environ(self):
+                # Add the TCP socket to environ in order for the websocket
+                # connections to use it.
+                environ = super().get_environ()
+                environ['socket'] = self.socket
+                # Disable support for HTTP chunking on reads which cause
+                # an issue when the connection is being upgraded, see
+                # https://github.com/gevent/gevent/issues/1712
+                if self._connection_upgrade_requested():
+                    environ['wsgi.input'] = self.rfile
+                    environ['wsgi.input_terminated'] = False
+                return environ
+
+        set_limit_memory_hard()
+        if os.name == 'posix':
+            signal.signal(signal.SIGQUIT, dumpstacks)
+            signal.signal(signal.SIGUSR1, log_ormcache_stats)
+            gevent.spawn(self.watchdog)
+
+        self.httpd = WSGIServer(
+            (self.interface, self.port), self.app,
+            log=logging.getLogger('longpolling'),
+            error_log=logging.getLogger('longpolling'),
+            handler_class=ProxyHandler,
+        )
+        _logger.info('Evented Service (longpolling) running on %s:%s', self.interface, self.port)
+        try:
+            self.httpd.serve_forever()
+        except:
+            _logger.exception("Evented Service (longpolling): uncaught error during main loop")
+            raise
+
+    def stop(self):
+        import gevent  # noqa: PLC0415
+        self.httpd.stop()
+        super().stop()
+        gevent.shutdown()
+
+    def run(self, preload, stop):
+        self.start()
+        self.stop()
+
+
+class PreforkServer(CommonServer):
+    """ Multiprocessing inspired by (g)unicorn.
+    PreforkServer currently uses accept(2) as dispatching method between
+    workers, all the HTTP workers sharing the listen socket of the master.
+    The workers are forked once the registries are preloaded, so that the
+    memory they use is shared copy-on-write.
+    """
+    def __init__(self, app):
+        super().__init__(app)
+        # config
+        self.population = config['workers']
+        self.timeout = config['limit_time_real']
+        self.limit_request = config['limit_request']
+        self.cron_timeout = config['limit_time_real_cron'] or None
+        if self.cron_timeout == -1:
+            self.cron_timeout = self.timeout
+        # working vars
+        self.beat = 4
+        self.socket = None
+        self.workers_http = {}
+        self.workers_cron = {}
+        self.workers = {}
+        self.generation = 0
+        self.queue = []
+        self.long_polling_pid = None
+
+    def pipe_new(self):
+        pipe = os.pipe()
+        for fd in pipe:
+            # non_blocking
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+            # close_on_exec
+            flags = fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC
+            fcntl.fcntl(fd, fcntl.F_SETFD, flags)
+        return pipe
+
+    def pipe_ping(self, pipe):
+        try:
+            os.write(pipe[1], b'.')
+        except IOError as e:
+            if e.errno not in [errno.EAGAIN, errno.EINTR]:
+                raise
+
+    def signal_handler(self, sig, frame):
+        if len(self.queue) < 5 or sig == signal.SIGCHLD:
+            self.queue.append(sig)
+            self.pipe_ping(self.pipe)
+        else:
+            _logger.warning("Dropping signal: %s", sig)
+
+    def worker_spawn(self, klass, workers_registry):
+        self.generation += 1
+        worker = klass(self)
+        pid = os.fork()
+        if pid != 0:
+            worker.pid = pid
+            self.workers[pid] = worker
+            workers_registry[pid] = worker
+            return worker
+        else:
+            worker.run()
+            sys.exit(0)
+
+    def long_polling_spawn(self):
+        nargs = stripped_sys_argv()
+        cmd = [sys.executable, sys.argv[0], 'gevent'] + nargs[1:]
+        popen = subprocess.Popen(cmd)
+        self.long_polling_pid = popen.pid
+
+    def worker_pop(self, pid):
+        if pid == self.long_polling_pid:
+            self.long_polling_pid = None
+        if pid in self.workers:
+            _logger.debug("Worker (%s) unregistered", pid)
+            try:
+                self.workers_http.pop(pid, None)
+                self.workers_cron.pop(pid, None)
+                u = self.workers.pop(pid)
+                u.close()
+            except OSError:
+                return
+
+    def worker_kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                self.worker_pop(pid)
+
+    def process_signals(self):
+        while len(self.queue):
+            sig = self.queue.pop(0)
+            if sig in [signal.SIGINT, signal.SIGTERM]:
+                raise KeyboardInterrupt
+            elif sig == signal.SIGHUP:
+                # restart on kill -HUP
+                global server_phoenix  # noqa: PLW0603
+                server_phoenix = True
+                raise KeyboardInterrupt
+            elif sig == signal.SIGQUIT:
+                # dump stacks on kill -3
+                dumpstacks()
+            elif sig == signal.SIGUSR1:
+                # log ormcache stats on kill -SIGUSR1
+                log_ormcache_stats()
+            elif sig == signal.SIGTTIN:
+                # increase number of workers
+                self.population += 1
+            elif sig == signal.SIGTTOU:
+                # decrease number of workers
+                self.population -= 1
+
+    def process_zombie(self):
+        # reap dead workers
+        while 1:
+            try:
+                wpid, status = os.waitpid(-1, os.WNOHANG)
+                if not wpid:
+                    break
+                if (status >> 8) == 3:
+                    msg = "Critial worker error (%s)"
+                    _logger.critical(msg, wpid)
+                    raise Exception(msg % wpid)
+                self.worker_pop(wpid)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    break
+                raise
+
+    def process_timeout(self):
+        now = time.time()
+        for (pid, worker) in self.workers.items():
+            if worker.watchdog_timeout is not None and \
+                    (now - worker.watchdog_time) >= worker.watchdog_timeout:
+                _logger.error("%s (%s) timeout after %ss",
+                              worker.__class__.__name__,
+                              pid,
+                              worker.watchdog_timeout)
+                self.worker_kill(pid, signal.SIGKILL)
+
+    def process_spawn(self):
+        if config['http_enable']:
+            while len(self.workers_http) < self.population:
+                self.worker_spawn(WorkerHTTP, self.workers_http)
+            if not self.long_polling_pid:
+                self.long_polling_spawn()
+        while len(self.workers_cron) < config['max_cron_threads']:
+            self.worker_spawn(WorkerCron, self.workers_cron)
+
+    def sleep(self):
+        try:
+            # map of fd -> worker
+            fds = {w.watchdog_pipe[0]: w for w in self.workers.values()}
+            fd_in = list(fds) + [self.pipe[0]]
+            # check for ping or internal wakeups
+            ready = select.select(fd_in, [], [], self.beat)
+            # update worker watchdogs
+            for fd in ready[0]:
+                if fd in fds:
+                    fds[fd].watchdog_time = time.time()
+                empty_pipe(fd)
+        except select.error as e:
+            if e.args[0] not in [errno.EINTR]:
+                raise
+
+    def start(self):
+        # wakeup pipe, python doesn't throw EINTR when a syscall is interrupted
+        # by a signal simulating a pseudo SA_RESTART. We write to a pipe in the
+        # signal handler to overcome this behaviour
+        self.pipe = self.pipe_new()
+        # set signal handlers
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+        signal.signal(signal.SIGHUP, self.signal_handler)
+        signal.signal(signal.SIGCHLD, self.signal_handler)
+        signal.signal(signal.SIGTTIN, self.signal_handler)
+        signal.signal(signal.SIGTTOU, self.signal_handler)
+        signal.signal(signal.SIGQUIT, dumpstacks)
+        signal.signal(signal.SIGUSR1, log_ormcache_stats)
+
+        if config['http_enable']:
+            # listen to socket
+            _logger.info('HTTP service (werkzeug) running on %s:%s', self.interface, self.port)
+            family = socket.AF_INET
+            if ':' in self.interface:
+                family = socket.AF_INET6
+            self.socket = socket.socket(family, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.setblocking(0)
+            self.socket.bind((self.interface, self.port))
+            self.socket.listen(8 * self.population)
+
+    def stop(self, graceful=True):
+        if self.long_polling_pid is not None:
+            # FIXME make longpolling process handle SIGTERM correctly
+            self.worker_kill(self.long_polling_pid, signal.SIGKILL)
+            self.long_polling_pid = None
+        if self.socket:
+            self.socket.close()
+        if graceful:
+            _logger.info("Stopping gracefully")
+            super().stop()
+            limit = time.time() + self.timeout
+            for pid in self.workers:
+                self.worker_kill(pid, signal.SIGINT)
+            while self.workers and time.time() < limit:
+                try:
+                    self.process_signals()
+                except KeyboardInterrupt:
+                    _logger.info("Forced shutdown.")
+                    break
+                self.process_zombie()
+                time.sleep(0.1)
+        else:
+            _logger.info("Stopping forcefully")
+        for pid in list(self.workers):
+            self.worker_kill(pid, signal.SIGTERM)
+
+    def run(self, preload, stop):
+        self.start()
+
+        # the workers listen for the registry signaling, not the master
+        inphms.modules.registry.disable_signaling_listener()
+        rc = preload_registries(preload)
+
+        if stop:
+            self.stop()
+            return rc
+
+        # Empty the cursor pool, we dont want them to be shared among forked workers.
+        inphms.sql_db.close_all()
+        # Move the objects of the preloaded registries out of reach of the
+        # garbage collector: collecting them in the workers would write to
+        # their memory pages, and defeat the copy-on-write sharing.
+        gc.collect()
+        gc.freeze()
+
+        _logger.debug("Multiprocess starting")
+        while 1:
+            try:
+                #_logger.debug("Multiprocess beat (%s)",time.time())
+                self.process_signals()
+                self.process_zombie()
+                self.process_timeout()
+                self.process_spawn()
+                self.sleep()
+            except KeyboardInterrupt:
+                _logger.debug("Multiprocess clean stop")
+                self.stop()
+                break
+            except Exception as e:
+                _logger.exception(e)
+                self.stop(False)
+                return -1
+
+
+class Worker(object):
+    """ Workers """
+    def __init__(self, multi):
+        self.multi = multi
+        self.watchdog_time = time.time()
+        self.watchdog_pipe = multi.pipe_new()
+        self.eintr_pipe = multi.pipe_new()
+        self.wakeup_fd_r, self.wakeup_fd_w = self.eintr_pipe
+        # Can be set to None if no watchdog is desired.
+        self.watchdog_timeout = multi.timeout
+        self.ppid = os.getpid()
+        self.pid = None
+        self.alive = True
+        # should we rename into lifetime ?
+        self.request_max = multi.limit_request
+        self.request_count = 0
+
+    def setproctitle(self, title=""):
+        setproctitle('inphms: %s %s %s' % (self.__class__.__name__, self.pid, title))
+
+    def close(self):
+        os.close(self.watchdog_pipe[0])
+        os.close(self.watchdog_pipe[1])
+        os.close(self.eintr_pipe[0])
+        os.close(self.eintr_pipe[1])
+
+    def signal_handler(self, sig, frame):
+        self.alive = False
+
+    def signal_time_expired_handler(self, n, stack):
+        # TODO: print actual RUSAGE_SELF (since last check_limits) instead of
+        #       just repeating the config setting
+        _logger.info('Worker (%d) CPU time limit (%s) reached.', self.pid, config['limit_time_cpu'])
+        # We dont suicide in such case
+        raise Exception('CPU time limit exceeded.')
+
+    def sleep(self):
+        try:
+            select.select([self.multi.socket, self.wakeup_fd_r], [], [], self.multi.beat)
+            # clear wakeup pipe if we were interrupted
+            empty_pipe(self.wakeup_fd_r)
+        except select.error as e:
+            if e.args[0] not in [errno.EINTR]:
+                raise
+
+    def check_limits(self):
+        # If our parent changed suicide
+        if self.ppid != os.getppid():
+            _logger.info("Worker (%s) Parent changed", self.pid)
+            self.alive = False
+        # check for lifetime
+        if self.request_count >= self.request_max:
+            _logger.info("Worker (%d) max request (%s) reached.", self.pid, self.request_count)
+            self.alive = False
+        # Reset the worker if it consumes too much memory (e.g. caused by a memory leak).
+        memory = memory_info(psutil.Process(os.getpid()))
+        if config['limit_memory_soft'] and memory > config['limit_memory_soft']:
+            _logger.info('Worker (%d) memory limit (RSS %s) reached.', self.pid, memory)
+            memtrace.log_top()
+            self.alive = False      # Commit suicide after the request.
+
+        set_limit_memory_hard()
+
+        # update RLIMIT_CPU so limit_time_cpu applies per unit of work
+        r = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_time = r.ru_utime + r.ru_stime
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_time + config['limit_time_cpu']), hard))
+
+    def process_work(self):
+        pass
+
+    def start(self):
+        self.pid = os.getpid()
+        self.setproctitle()
+        _logger.info("Worker %s (%s) alive", self.__class__.__name__, self.pid)
+        # Reseed the random number generator
+        random.seed()
+        if self.multi.socket:
+            # Prevent fd inheritance: close_on_exec
+            flags = fcntl.fcntl(self.multi.socket, fcntl.F_GETFD) | fcntl.FD_CLOEXEC
+            fcntl.fcntl(self.multi.socket, fcntl.F_SETFD, flags)
+            # reset blocking status
+            self.multi.socket.setblocking(0)
+
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGXCPU, self.signal_time_expired_handler)
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(self.wakeup_fd_w)
+
+    def stop(self):
+        pass
+
+    def run(self):
+        try:
+            self.start()
+            t = threading.Thread(name="Worker %s (%s) workthread" % (self.__class__.__name__, self.pid), target=self._runloop)
+            t.daemon = True
+            t.start()
+            t.join()
+            _logger.info("Worker (%s) exiting. request_count: %s, registry count: %s.",
+                         self.pid, self.request_count,
+                         len(Registry.registries))
+            self.stop()
+        except Exception:
+            _logger.exception("Worker (%s) Exception occurred, exiting...", self.pid)
+            # should we use 3 to abort everything ?
+            sys.exit(1)
+
+    def _runloop(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, {
+            signal.SIGXCPU,
+            signal.SIGINT, signal.SIGQUIT, signal.SIGUSR1,
+        })
+        try:
+            while self.alive:
+                self.check_limits()
+                self.multi.pipe_ping(self.watchdog_pipe)
+                self.sleep()
+                if not self.alive:
+                    break
+                self.process_work()
+        except:
+            _logger.exception("Worker %s (%s) Exception occurred, exiting...", self.__class__.__name__, self.pid)
+            sys.exit(1)
+
+class WorkerHTTP(Worker):
+    """ HTTP Request workers """
+    def __init__(self, multi):
+        super().__init__(multi)
+
+        # The INPHMS_HTTP_SOCKET_TIMEOUT environment variable allows to control socket timeout for
+        # extreme latency situations. It's generally better to use a good buffering reverse proxy
+        # to quickly free workers rather than increasing this timeout to accommodate high network
+        # latencies & b/w saturation. This timeout is also essential to protect against accidental
+        # DoS due to idle HTTP connections.
+        sock_timeout = os.environ.get("INPHMS_HTTP_SOCKET_TIMEOUT")
+        self.sock_timeout = float(sock_timeout) if sock_timeout else 2
+
+    def process_request(self, client, addr):
+        client.setblocking(1)
+        client.settimeout(self.sock_timeout)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Prevent fd inherientence close_on_exec
+        flags = fcntl.fcntl(client, fcntl.F_GETFD) | fcntl.FD_CLOEXEC
+        fcntl.fcntl(client, fcntl.F_SETFD, flags)
+        # do request using BaseWSGIServerNoBind monkey patched with socket
+        self.server.socket = client
+        # tolerate broken pipe when the http client closes the socket before
+        # receiving the full reply
+        try:
+            self.server.process_request(client, addr)
+        except IOError as e:
+            if e.errno != errno.EPIPE:
+                raise
+        self.request_count += 1
+
+    def process_work(self):
+        try:
+            client, addr = self.multi.socket.accept()
+            self.process_request(client, addr)
+        except socket.error as e:
+            if e.errno not in (errno.EAGAIN, errno.ECONNABORTED):
+                raise
+
+    def start(self):
+        Worker.start(self)
+        self.server = BaseWSGIServerNoBind(self.multi.app)
+
+class WorkerCron(Worker):
+    """ Cron workers """
+
+    def __init__(self, multi):
+        super().__init__(multi)
+        # process_work() below process a single due database per call.
+        self.cron_queue = CronQueue()
+        self.watchdog_timeout = multi.cron_timeout  # Use a distinct value for CRON Worker
+
+    def sleep(self):
+        # Really sleep once all the due databases have been processed.
+        interval = min(SLEEP_INTERVAL + self.pid % 10, self.cron_queue.timeout())   # chorus effect
+        if interval > 0:
+            # simulate interruptible sleep with select(wakeup_fd, timeout)
+            try:
+                select.select([self.wakeup_fd_r, self.dbcursor._cnx], [], [], interval)
+                # clear pg_conn/wakeup_fd if we were interrupted
+                self.dbcursor._cnx.poll()
+                empty_pipe(self.wakeup_fd_r)
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+
+    def _db_list(self):
+        if config['db_name']:
+            db_names = config['db_name'].split(',')
+        else:
+            db_names = inphms.service.db.list_dbs(True)
+        return db_names
+
+    def process_work(self):
+        _logger.debug("WorkerCron (%s) polling for jobs", self.pid)
+        db_names = self._db_list()
+        self.cron_queue.discover(db_names)
+        self.cron_queue.notified(self.dbcursor._cnx, db_names)
+        db_name = self.cron_queue.pop()
+        if db_name:
+            self.setproctitle(db_name)
+
+            from inphms.addons.base.models.ir_cron import ir_cron, cron_stats  # noqa: PLC0415
+            delay = SLEEP_INTERVAL
+            try:
+                ir_cron._process_jobs(db_name)
+                delay = ir_cron._get_next_job_delay(db_name)
+            finally:
+                self.cron_queue.done(db_name, delay)
+            cron_stats.log()
+
+            # dont keep cursors in multi database mode
+            if len(db_names) > 1:
+                inphms.sql_db.close_db(db_name)
+
+            self.request_count += 1
+            if self.request_count >= self.request_max and self.request_max < len(db_names):
+                _logger.error("There are more dabatases to process than allowed "
+                              "by the `limit_request` configuration variable: %s more.",
+                              len(db_names) - self.request_max)
+
+    def start(self):
+        os.nice(10)     # mommy always told me to be nice with others...
+        Worker.start(self)
+        if self.multi.socket:
+            self.multi.socket.close()
+
+        dbconn = inphms.sql_db.db_connect('postgres')
+        self.dbcursor = dbconn.cursor()
+        # LISTEN / NOTIFY doesn't work in recovery mode
+        self.dbcursor.execute("SELECT pg_is_in_recovery()")
+        in_recovery = self.dbcursor.fetchone()[0]
+        if not in_recovery:
+            self.dbcursor.execute("LISTEN cron_trigger")
+        else:
+            _logger.warning("PG cluster in recovery mode, cron trigger not activated")
+        self.dbcursor.commit()
+
+    def stop(self):
+        super().stop()
+        self.dbcursor.close()
 
 
 #----------------------------------------------------------
@@ -558,31 +1641,51 @@ class ThreadedWSGIServerReloadable(LoggingBaseWSGIServerMixIn, werkzeug.serving.
     """
     def __init__(self, host, port, app): #ichecked
         # The INPHMS_MAX_HTTP_THREADS environment variable allows to limit the amount of concurrent
-        # socket connections accepted by a threaded server, implicitly limiting the amount of
-        # concurrent threads running for http requests handling.
-        self.max_http_threads = os.environ.get("INPHMS_MAX_HTTP_THREADS")
-        if self.max_http_threads:
-            try:
-                self.max_http_threads = int(self.max_http_threads)
-            except ValueError:
-                # If the value can't be parsed to an integer then it's computed in an automated way to
-                # half the size of db_maxconn because while most requests won't borrow cursors concurrently
-                # there are some exceptions where some controllers might allocate two or more cursors.
-                self.max_http_threads = max((config['db_maxconn'] - config['max_cron_threads']) // 2, 1)
-            # Semaphore is a thread-safe counter, used to limit the number of concurrent threads.
-            # Like a "bouncer" at a club, only allow a certain number of people in at a time.
-            self.http_threads_sem = threading.Semaphore(self.max_http_threads)
+        # threads running for http requests handling, 0 meaning no limit. Connections accepted while
+        # all the threads are busy wait in a queue of INPHMS_HTTP_QUEUE_SIZE connections (by default
+        # as many as threads), and are rejected with a 503 response when the queue is full.
+        try:
+            self.max_http_threads = int(os.environ["INPHMS_MAX_HTTP_THREADS"])
+        except (KeyError, ValueError):
+            # If the value is missing or can't be parsed to an integer then it's computed in an automated
+            # way to half the size of db_maxconn because while most requests won't borrow cursors
+            # concurrently there are some exceptions where some controllers might allocate two or more cursors.
+            self.max_http_threads = max((config['db_maxconn'] - config['max_cron_threads']) // 2, 1)
+        self.http_queue_size = int(os.environ.get("INPHMS_HTTP_QUEUE_SIZE") or self.max_http_threads or 0)
+
+        # Pool of the threads processing the requests, which are reused from
+        # one request to the other. It grows on demand up to max_http_threads,
+        # and shrinks as threads stay idle for HTTP_THREAD_IDLE_TIMEOUT.
+        self.http_queue = queue.SimpleQueue()
+        self.http_threads = set()
+        # number of idle threads, minus the number of requests waiting for one
+        self.http_threads_idle = 0
+        self.http_threads_lock = threading.Lock()
+        # gauges, see http_stats()
+        self.http_requests_count = 0
+        self.http_requests_rejected = 0
+        self.http_queue_time = 0.0
+        self.http_queue_time_max = 0.0
+        # set by ThreadedServer, cancels the requests exceeding the time limit
+        self.watchdog = None
+
         super().__init__(host, port, app, handler=RequestHandler)
 
         # See https://github.com/pallets/werkzeug/pull/770
         # This allow the request threads to not be set as daemon
         # so the server waits for them when shutting down gracefully.
         self.daemon_threads = False # werkzeug attribute
-    
+
     def server_bind(self): #ichecked
         SD_LISTEN_FDS_START = 3 # systemd on linux, listen on socket fd
-        if os.environ.get('LISTEN_FDS') == '1' and os.environ.get('LISTEN_PID') == str(os.getpid()):
+        if os.environ.get('LISTEN_FDS') == '1' and (
+            os.environ.get('LISTEN_PID') == str(os.getpid())
+            # spawned for a graceful reload, see ThreadedServer.spawn_successor()
+            or os.environ.get('INPHMS_RELOAD_PREDECESSOR') == str(os.getppid())
+        ):
             self.reload_socket = True
+            # keep the socket on a later reexec of this process
+            os.environ['LISTEN_PID'] = str(os.getpid())
             self.socket = socket.fromfd(SD_LISTEN_FDS_START, socket.AF_INET, socket.SOCK_STREAM)
             _logger.info('HTTP service (werkzeug) running through socket activation')
         else: #normal case, bind to port
@@ -597,35 +1700,142 @@ class ThreadedWSGIServerReloadable(LoggingBaseWSGIServerMixIn, werkzeug.serving.
         if not self.reload_socket:
             super().server_activate()
 
-    def _handle_request_noblock(self): #ichecked
-        if self.max_http_threads and not self.http_threads_sem.acquire(timeout=0.1):
-            # If the semaphore is full we will return immediately to the upstream (most probably
-            # socketserver.BaseServer's serve_forever loop  which will retry immediately as the
-            # selector will find a pending connection to accept on the socket. There is a 100 ms
-            # penalty in such case in order to avoid cpu bound loop while waiting for the semaphore.
-            return
-        # upstream _handle_request_noblock will handle errors and call shutdown_request in any cases
-        super()._handle_request_noblock()
-    
     def process_request(self, request, client_address): #ichecked
         """
-        Start a new thread to process the request.
-        Override the default method of class socketserver.ThreadingMixIn
-        to be able to get the thread object which is instantiated
-        and set its start time as an attribute
+        Hand the request over to an idle thread of the pool, spawn a new
+        thread if there is none and the pool is not full, or reject the
+        request with a 503 response when too many requests are waiting.
+        Override the default method of class socketserver.ThreadingMixIn.
         """
-        t = threading.Thread(target = self.process_request_thread,
-                             args = (request, client_address))
+        with self.http_threads_lock:
+            reject = False
+            if self.http_threads_idle <= 0:
+                if not self.max_http_threads or len(self.http_threads) < self.max_http_threads:
+                    self._http_thread_spawn()
+                elif -self.http_threads_idle >= self.http_queue_size:
+                    self.http_requests_rejected += 1
+                    reject = True
+            if not reject:
+                self.http_threads_idle -= 1
+            threads, queued = len(self.http_threads), -self.http_threads_idle
+        if reject:
+            # the client may be slow, don't hold the lock meanwhile
+            self._reject_request(request, client_address, threads, queued)
+            return
+        self.http_queue.put((request, client_address, time.monotonic()))
+
+    def _http_thread_spawn(self):
+        t = threading.Thread(target=self._http_thread_run, name='inphms.service.http.pool')
         t.daemon = self.daemon_threads
         t.type = 'http'
-        t.start_time = time.time()
+        t.start_time = None
+        self.http_threads.add(t)
+        self.http_threads_idle += 1
         t.start()
 
-    def shutdown_request(self, request): #ichecked
-        if self.max_http_threads:
-            # upstream is supposed to call this function no matter what happens during processing
-            self.http_threads_sem.release()
-        super().shutdown_request(request)
+    def _http_thread_run(self):
+        me = threading.current_thread()
+        try:
+            while True:
+                try:
+                    item = self.http_queue.get(timeout=HTTP_THREAD_IDLE_TIMEOUT)
+                except LimitTimeRealExceeded:
+                    # the previous request was over before its cancellation
+                    continue
+                except queue.Empty:
+                    with self.http_threads_lock:
+                        # retire the thread unless a request is waiting for it
+                        if self.http_threads_idle > 0:
+                            self.http_threads_idle -= 1
+                            self.http_threads.discard(me)
+                            break
+                    continue
+                if item is None:
+                    break
+                request, client_address, enqueued = item
+                released = False
+                try:
+                    try:
+                        queue_time = time.monotonic() - enqueued
+                        with self.http_threads_lock:
+                            self.http_requests_count += 1
+                            self.http_queue_time += queue_time
+                            self.http_queue_time_max = max(self.http_queue_time_max, queue_time)
+                        # the request may have turned the thread into a websocket one
+                        me.type = 'http'
+                        me.start_time = time.time()
+                        if self.watchdog:
+                            self.watchdog.watch(me)
+                        self.process_request_thread(request, client_address)
+                    finally:
+                        if self.watchdog:
+                            self.watchdog.release(me)
+                        me.start_time = None
+                        # reset the attributes the request set on the thread
+                        for attr in ('dbname', 'uid', 'url', 'route', 'query_count', 'query_time', 'perf_t0', 'cursor_mode'):
+                            me.__dict__.pop(attr, None)
+                        with self.http_threads_lock:
+                            self.http_threads_idle += 1
+                            released = True
+                except LimitTimeRealExceeded:
+                    # the cancellation reached the thread outside of the
+                    # processing of the request, which closes the socket
+                    self.shutdown_request(request)
+                    if not released:
+                        with self.http_threads_lock:
+                            self.http_threads_idle += 1
+        finally:
+            with self.http_threads_lock:
+                self.http_threads.discard(me)
+
+    def _reject_request(self, request, client_address, threads, queued):
+        _logger.warning("HTTP request from %s rejected, %d threads busy and %d requests queued",
+                        client_address[0], threads, queued)
+        try:
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Retry-After: 1\r\n"
+                b"Content-Length: 0\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def http_stats(self):
+        """ Return the gauges of the request threads pool. """
+        with self.http_threads_lock:
+            return {
+                'threads': len(self.http_threads),
+                'threads_active': len(self.http_threads) - max(self.http_threads_idle, 0),
+                'threads_max': self.max_http_threads or None,
+                'queued': max(-self.http_threads_idle, 0),
+                'requests': self.http_requests_count,
+                'requests_rejected': self.http_requests_rejected,
+                'queue_time_total': self.http_queue_time,
+                'queue_time_max': self.http_queue_time_max,
+            }
+
+    def shutdown(self):
+        super().shutdown()
+        # let the threads of the pool exit once done with their request
+        with self.http_threads_lock:
+            for _thread in self.http_threads:
+                self.http_queue.put(None)
+
+class BaseWSGIServerNoBind(LoggingBaseWSGIServerMixIn, werkzeug.serving.BaseWSGIServer):
+    """ werkzeug Base WSGI Server patched to skip socket binding. PreforkServer
+    use this class, sets the socket and calls the process_request() manually
+    """
+    def __init__(self, app):
+        werkzeug.serving.BaseWSGIServer.__init__(self, "127.0.0.1", 0, app, handler=RequestHandler)
+        # Directly close the socket. It will be replaced by WorkerHTTP when processing requests
+        if self.socket:
+            self.socket.close()
+
+    def server_activate(self):
+        # dont listen as we use PreforkServer#socket
+        pass
 
 # DONE
 class RequestHandler(werkzeug.serving.WSGIRequestHandler):
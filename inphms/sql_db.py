@@ -14,11 +14,13 @@ import threading
 import time
 import typing
 import uuid
+import weakref
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from inspect import currentframe
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extensions
 import psycopg2.extras
 from psycopg2.extensions import ISOLATION_LEVEL_REPEATABLE_READ
@@ -69,6 +71,8 @@ def categorize_query(decoded_query):
 
 
 sql_counter = 0
+# total time spent in queries, in seconds
+sql_time = 0.0
 
 MAX_IDLE_TIMEOUT = 60 * 10
 
@@ -225,6 +229,14 @@ class Cursor(BaseCursor):
         else:
             self.__caller = False
         self._closed = False   # real initialization value
+        # the cursors of a thread, whose queries the watchdog may cancel while
+        # they are executed, see cancel_queries()
+        self._cancel_lock = threading.Lock()
+        self._executing = False
+        thread = threading.current_thread()
+        if 'cursors' not in thread.__dict__:
+            thread.cursors = weakref.WeakSet()
+        thread.cursors.add(self)
         # See the docstring of this class.
         # self.connection is psycopg2.extensions.connection
         # this Cursor() is a wrapper around psycopg2.extensions.cursor
@@ -234,6 +246,10 @@ class Cursor(BaseCursor):
 
         self.cache = {}
         self._now = None
+        # query count above which execute() refuses to run, and number of
+        # queries allowed per attempt, see set_resource_limits()
+        self.max_queries = None
+        self.query_budget = None
         if os.getenv('INPHMS_FAKETIME_TEST_MODE') and self.dbname in tools.config['db_name'].split(','):
             self.execute("SET search_path = public, pg_catalog;")
             self.commit()  # ensure that the search_path remains after a rollback
@@ -310,6 +326,32 @@ class Cursor(BaseCursor):
         return result
 
 
+    def set_resource_limits(self, statement_timeout=None, max_queries=None):
+        """ Bound the resources the cursor may consume on the database.
+
+        :param float statement_timeout: maximum duration of every statement
+            executed on the cursor, in seconds. The setting survives commits
+            and rollbacks and is reset once the connection is given back to
+            the pool.
+        :param int max_queries: maximum number of additional queries the
+            cursor may execute, further queries raise
+            :class:`psycopg2.errors.QueryCanceled`. The budget is renewed by
+            :meth:`reset_query_budget`.
+        """
+        if statement_timeout:
+            self.execute("SET statement_timeout = %s", [int(statement_timeout * 1000)])
+            self.commit()  # ensure that the timeout remains after a rollback
+        if max_queries:
+            self.query_budget = max_queries
+            self.reset_query_budget()
+
+    def reset_query_budget(self):
+        """ Give the cursor its whole query budget again, so that a new
+        attempt of a transaction is not charged for the queries of the
+        attempts rolled back before it. """
+        if self.query_budget:
+            self.max_queries = self.sql_log_count + self.query_budget
+
     def mogrify(self, query, params=None):
         if isinstance(query, SQL):
             assert params is None, "Unexpected parameters for SQL query object"
@@ -321,7 +363,7 @@ class Cursor(BaseCursor):
         return self.mogrify(query, params).decode(encoding, 'replace')
     
     def execute(self, query, params=None, log_exceptions=True):
-        global sql_counter
+        global sql_counter, sql_time  # noqa: PLW0603
 
         if isinstance(query, SQL):
             assert params is None, "Unexpected parameters for SQL query object"
@@ -331,10 +373,26 @@ class Cursor(BaseCursor):
             # psycopg2's TypeError is not clear if you mess up the params
             raise ValueError("SQL query parameters should be a tuple, list or dict; got %r" % (params,))
 
+        if self.max_queries is not None and self.sql_log_count >= self.max_queries:
+            # lift the budget so that the error can be handled on this cursor
+            self.max_queries = None
+            raise psycopg2.errors.QueryCanceled("canceling statement due to query budget (%d queries) exhausted" % self.sql_log_count)
+
+        current_thread = threading.current_thread()
+        if getattr(current_thread, 'request_cancelled', False):
+            # the watchdog cancelled the request of the thread
+            raise psycopg2.errors.QueryCanceled("canceling statement due to request time limit")
+
         start = real_time()
         try:
             params = params or None
-            res = self._obj.execute(query, params)
+            with self._cancel_lock:
+                self._executing = True
+            try:
+                res = self._obj.execute(query, params)
+            finally:
+                with self._cancel_lock:
+                    self._executing = False
         except Exception as e:
             if log_exceptions:
                 _logger.error("bad query: %s\nERROR: %s", self._obj.query or query, e)
@@ -347,8 +405,8 @@ class Cursor(BaseCursor):
         # simple query count is always computed
         self.sql_log_count += 1
         sql_counter += 1
+        sql_time += delay
 
-        current_thread = threading.current_thread()
         if hasattr(current_thread, 'query_count'):
             current_thread.query_count += 1
             current_thread.query_time += delay
@@ -526,6 +584,15 @@ class ConnectionPool(object):
     def readonly(self): #ichecked
         return self._readonly
 
+    def stats(self):
+        """ Return the number of used and open connections, and the maximum. """
+        connections = self._connections[:]
+        return {
+            'used': sum(1 for _cnx, used, _last_used in connections if used),
+            'count': len(connections),
+            'max': self._maxconn,
+        }
+
     def _debug(self, msg, *args):
         _logger_conn.debug(('%r ' + msg), self, *args)
     
@@ -702,4 +769,19 @@ def close_all(): #ichecked
     if _Pool:
         _Pool.close_all()
     if _Pool_readonly:
-        _Pool_readonly.close_all()
\ No newline at end of file
+        _Pool_readonly.close_all()
+
+
+def cancel_queries(thread):
+    """ Cancel the queries running on the open cursors of the given thread.
+    A cursor is only cancelled while it executes a query, under the lock that
+    execute() holds to flag it, so that its connection cannot be given back
+    to the pool and reused by another thread meanwhile. """
+    for cr in list(getattr(thread, 'cursors', ())):
+        with cr._cancel_lock:
+            if cr._closed or not cr._executing:
+                continue
+            try:
+                cr._cnx.cancel()
+            except psycopg2.Error:
+                _logger.warning("Failed to cancel the query of %s", thread, exc_info=True)
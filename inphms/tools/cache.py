@@ -3,26 +3,45 @@
 
 # decorator makes wrappers that have the same API as their wrapped function
 from collections import Counter, defaultdict
+import contextlib
 from decorator import decorator
 from inspect import signature, Parameter
 import logging
+import sys
+import threading
 import time
+import types
 import warnings
 
+from .misc import Histogram
+
 unsafe_eval = eval
 
 _logger = logging.getLogger(__name__)
 
+# upper bounds of the buckets of the generation times, in seconds
+GEN_TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+# number of entries per cache measured to estimate the memory size of a cache
+SIZE_SAMPLES = 64
+# maximum time a thread waits for another one computing the value it misses,
+# in seconds, before computing it itself
+SINGLE_FLIGHT_TIMEOUT = 30
+
 
 class ormcache_counter(object):
-    """ Statistic counters for cache entries. """
-    __slots__ = ['hit', 'miss', 'err', 'gen_time', 'cache_name']
+    """ Statistic counters for cache entries. The lookups which waited for
+    the value being computed by another thread are counted in ``coalesced``
+    and not as misses, and the time they waited in ``coalesced_time``. """
+    __slots__ = ['hit', 'miss', 'err', 'coalesced', 'coalesced_time', 'gen_time', 'gen_times', 'cache_name']
 
     def __init__(self):
         self.hit = 0
         self.miss = 0
         self.err = 0
+        self.coalesced = 0
+        self.coalesced_time = 0
         self.gen_time = 0
+        self.gen_times = Histogram(GEN_TIME_BUCKETS)
         self.cache_name = None
 
     @property
@@ -33,6 +52,21 @@ class ormcache_counter(object):
 STAT = defaultdict(ormcache_counter)
 
 
+class _Flight(object):
+    """ Computation of a cache value, awaited by the threads missing it. """
+    __slots__ = ['owner', 'done', 'failed', 'value']
+
+    def __init__(self):
+        self.owner = threading.current_thread()
+        self.done = threading.Event()
+        self.failed = False
+        self.value = None
+
+# computations in progress, maps (id(cache), key) to _Flight
+_flights = {}
+_flights_lock = threading.Lock()
+
+
 class ormcache(object):
     """ LRU cache decorator for model methods.
     The parameters are strings that represent expressions referring to the
@@ -77,17 +111,78 @@ class ormcache(object):
             counter.hit += 1
             return r
         except KeyError:
-            counter.miss += 1
-            counter.cache_name = self.cache_name
-            start = time.time()
-            value = d[key] = self.method(*args, **kwargs)
-            counter.gen_time += time.time() - start
-            return value
+            return self.single_flight(d, key, counter, args, kwargs)
         except TypeError:
             _logger.warning("cache lookup error on %r", key, exc_info=True)
             counter.err += 1
             return self.method(*args, **kwargs)
 
+    def single_flight(self, d, key, counter, args, kwargs):
+        """ Compute the missing value at ``key``, unless another thread is
+        already computing it: wait for its value in that case. If that thread
+        fails, or takes longer than ``SINGLE_FLIGHT_TIMEOUT``, the waiting
+        threads compute the value concurrently. """
+        flight_key = (id(d), key)
+        with _flights_lock:
+            flight = _flights.get(flight_key)
+            if flight is None or flight.done.is_set():
+                # a finished flight is left over by an interrupted cleanup
+                flight = _flights[flight_key] = _Flight()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            # a recursive lookup of the value being computed by this thread
+            # cannot wait for itself
+            if flight.owner is not threading.current_thread():
+                start = time.monotonic()
+                deadline = start + SINGLE_FLIGHT_TIMEOUT
+                # wait by slices, the thread must remain cancellable
+                while not flight.done.wait(1):
+                    if time.monotonic() >= deadline or not flight.owner.is_alive():
+                        # don't let the next lookups wait for a stale flight
+                        with _flights_lock:
+                            if _flights.get(flight_key) is flight:
+                                del _flights[flight_key]
+                        break
+                counter.coalesced_time += time.monotonic() - start
+                if flight.done.is_set() and not flight.failed:
+                    counter.coalesced += 1
+                    return flight.value
+            # the failure may be specific to the transaction of the other
+            # thread: compute the value concurrently with the other waiters
+            return self.generate(d, key, counter, args, kwargs)
+
+        try:
+            flight.value = self.generate(d, key, counter, args, kwargs)
+            return flight.value
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            # release the waiters first: if the cleanup is interrupted, the
+            # finished flight is replaced or dropped by the next lookups
+            flight.done.set()
+            with _flights_lock:
+                if _flights.get(flight_key) is flight:
+                    del _flights[flight_key]
+
+    def generate(self, d, key, counter, args, kwargs):
+        """ Compute the value at ``key`` and store it in ``d``. """
+        counter.miss += 1
+        counter.cache_name = self.cache_name
+        start = time.time()
+        value = d[key] = self.method(*args, **kwargs)
+        gen_time = time.time() - start
+        if d.max_size is not None:
+            # the entry may have been evicted by another thread meanwhile
+            with contextlib.suppress(KeyError):
+                d.set_size(key, _sizeof(value, set()))
+        counter.gen_time += gen_time
+        counter.gen_times.observe(gen_time)
+        return value
+
     def determine_key(self):
         """ Determine the function that computes a cache key from arguments. """
         if self.skiparg is None:
@@ -134,4 +229,130 @@ class ormcache_context(ormcache):
         else:
             code = "lambda %s: (%s,)" % (args, keys_expr)
         self.key = unsafe_eval(code)
-        
\ No newline at end of file
+
+
+def _sizeof(obj, seen, depth=4):
+    """ Approximate the memory size of ``obj``, including the objects it
+    contains down to ``depth`` levels. Objects in ``seen`` are not counted. """
+    if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if depth:
+        depth -= 1
+        if isinstance(obj, dict):
+            size += sum(_sizeof(key, seen, depth) + _sizeof(val, seen, depth) for key, val in obj.items())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            size += sum(_sizeof(item, seen, depth) for item in obj)
+        elif hasattr(obj, '__dict__'):
+            size += _sizeof(vars(obj), seen, depth)
+    return size
+
+
+def _cache_size(items):
+    """ Estimate the memory size of the given cache entries from a sample. """
+    if not items:
+        return 0
+    step = max(len(items) // SIZE_SAMPLES, 1)
+    sample = items[::step]
+    seen = set()
+    size = sum(_sizeof(key, seen) + _sizeof(val, seen) for key, val in sample)
+    return size * len(items) // len(sample)
+
+
+def _quantile(histogram, q):
+    bound = histogram.quantile(q)
+    # the values above the last bound have no upper bound
+    return None if bound == float('inf') else bound
+
+
+def get_ormcache_stats():
+    """ Return the statistics of the ormcaches of the registries loaded in
+    the process, as a JSON-serializable dict::
+
+        {db_name: {cache_name: {
+            'entries': int, 'max_entries': int, 'size': int, 'evictions': int,
+            'methods': {'model.method': {
+                'entries': int, 'hit': int, 'miss': int, 'err': int,
+                'coalesced': int, 'coalesced_time': float, 'ratio': float, 'gen_time': float, 'gen_time_p50': float,
+                'gen_time_p95': float, 'gen_time_p99': float,
+            }},
+        }}}
+
+    The ``size`` of a cache is an estimate in bytes, extrapolated from a
+    sample of its entries. The caches bounded in size or in time also report
+    their ``max_size``, their ``total_size`` as estimated on insertion, and
+    their ``expirations``. The generation time percentiles are the upper
+    bounds of the buckets they fall in, or ``None`` above the last bucket.
+    """
+    from inphms.modules.registry import Registry  # noqa: PLC0415
+    with Registry.registries._lock:
+        registries = list(Registry.registries.d.items())
+    counters = defaultdict(dict)
+    for (db_name, model_name, method), counter in list(STAT.items()):
+        counters[db_name, counter.cache_name or 'default'][model_name, method] = counter
+
+    stats = {}
+    for db_name, registry in sorted(registries, key=lambda item: item[0]):
+        db_stats = stats[db_name] = {}
+        for cache_name, cache in registry._Registry__caches.items():
+            items = cache.snapshot()
+            entries = Counter(key[:2] for key, _val in items)
+            methods = {}
+            for model_name, method in entries.keys() | counters[db_name, cache_name].keys():
+                counter = counters[db_name, cache_name].get((model_name, method)) or ormcache_counter()
+                methods[f'{model_name}.{method.__name__}'] = {
+                    'entries': entries[model_name, method],
+                    'hit': counter.hit,
+                    'miss': counter.miss,
+                    'err': counter.err,
+                    'coalesced': counter.coalesced,
+                    'coalesced_time': counter.coalesced_time,
+                    'ratio': counter.ratio,
+                    'gen_time': counter.gen_time,
+                    'gen_time_p50': _quantile(counter.gen_times, 0.5),
+                    'gen_time_p95': _quantile(counter.gen_times, 0.95),
+                    'gen_time_p99': _quantile(counter.gen_times, 0.99),
+                }
+            db_stats[cache_name] = {
+                'entries': len(items),
+                'max_entries': cache.count,
+                'size': _cache_size(items),
+                'evictions': cache.evictions,
+                'methods': dict(sorted(methods.items())),
+            }
+            if cache.max_size is not None:
+                db_stats[cache_name]['max_size'] = cache.max_size
+                db_stats[cache_name]['total_size'] = cache.total_size
+            if cache.ttl is not None:
+                db_stats[cache_name]['expirations'] = cache.expirations
+    return stats
+
+
+def log_ormcache_stats(sig=None, frame=None):  # noqa: ARG001 (arguments are there for signals)
+    """ Log the statistics of the ormcaches by database, cache and method. """
+    def fmt(value):
+        return '-' if value is None else f'{value:g}s'
+
+    lines = ['Caches stats:']
+    for db_name, caches in get_ormcache_stats().items():
+        for cache_name, cache in caches.items():
+            line = (
+                f"{db_name}, {cache_name}: {cache['entries']}/{cache['max_entries']} entries, "
+                f"~{cache['size'] // 1024} KiB, {cache['evictions']} evictions"
+            )
+            if 'max_size' in cache:
+                line += f", {cache['total_size'] // 1024}/{cache['max_size'] // 1024} KiB bounded"
+            if 'expirations' in cache:
+                line += f", {cache['expirations']} expirations"
+            lines.append(line)
+            methods = sorted(cache['methods'].items(), key=lambda item: item[1]['gen_time'], reverse=True)
+            for name, method in methods:
+                lines.append(
+                    f"  {name}: {method['entries']:6d} entries, {method['hit']:6d} hit, "
+                    f"{method['miss']:6d} miss, {method['err']:6d} err, {method['coalesced']:6d} coalesced, "
+                    f"{method['ratio']:5.1f}% ratio, "
+                    f"{method['gen_time']:.3f}s gen time (p50 {fmt(method['gen_time_p50'])}, "
+                    f"p95 {fmt(method['gen_time_p95'])}, p99 {fmt(method['gen_time_p99'])})"
+                )
+    _logger.info('\n'.join(lines))
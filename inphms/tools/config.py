@@ -87,6 +87,7 @@ class configmanager(object):
         self.blacklist_for_save = set([
             'publisher_warranty_url', 'load_language', 'root_path',
             'init', 'save', 'config', 'update', 'stop_after_init', 'dev_mode', 'shell_interface',
+            'profile_startup',
         ])
         
         # dictionary mapping option destination (keys in self.options) to MyOptions.
@@ -150,6 +151,15 @@ class configmanager(object):
                          help="Activate X-Sendfile (apache) and X-Accel-Redirect (nginx) "
                               "HTTP response header to delegate the delivery of large "
                               "files (assets/attachments) to the web server.")
+        group.add_option("--metrics", dest="metrics_enable", action="store_true", my_default=False,
+                         help="Expose the metrics of the server processes on /metrics, in the text format "
+                              "of Prometheus, and their ormcache and cron statistics on /web/ormcache/stats "
+                              "and /web/cron/stats. They reveal the names of the databases and of the "
+                              "cron jobs, restrict the access to those URLs on the reverse proxy.")
+        group.add_option("--asgi", dest="asgi", action="store_true", my_default=False,
+                         help="Serve the HTTP requests with the asyncio ASGI server (requires "
+                              "uvicorn) instead of the threaded WSGI server. Ignored in "
+                              "multi-process mode.")
         # HTTP: hidden backwards-compatibility for "*xmlrpc*" options
         hidden = optparse.SUPPRESS_HELP
         group.add_option("--xmlrpc-interface", dest="http_interface", help=hidden)
@@ -310,6 +320,14 @@ class configmanager(object):
                               "[ipython|ptpython|bpython|python]")
         group.add_option("--stop-after-init", action="store_true", dest="stop_after_init", my_default=False,
                           help="stop the server after its initialization")
+        group.add_option("--profile-startup", action="store_true", dest="profile_startup", my_default=False,
+                         help="log the time spent importing each module when starting the server, then exit")
+        group.add_option("--memory-sampling-rate", dest="memory_sampling_rate", my_default=0.0,
+                         help="Fraction of the HTTP requests whose memory allocations are traced "
+                              "with tracemalloc, e.g. 0.01 for one request out of a hundred. The "
+                              "routes allocating the most are logged when the soft memory limit is "
+                              "reached. Tracing slows down the whole server, 0 disables it (default).",
+                         type="float")
         group.add_option("--osv-memory-count-limit", dest="osv_memory_count_limit", my_default=0,
                          help="Force a limit on the maximum number of records kept in the virtual "
                               "osv_memory tables. By default there is no limit.",
@@ -340,12 +358,13 @@ class configmanager(object):
                              help="Specify the number of workers, 0 disable prefork mode.",
                              type="int")
             group.add_option("--limit-memory-soft", dest="limit_memory_soft", my_default=2048 * 1024 * 1024,
-                             help="Maximum allowed virtual memory per worker (in bytes), when reached the worker be "
-                             "reset after the current request (default 2048MiB).",
+                             help="Maximum allowed resident memory (RSS) per worker, or per threaded server "
+                             "process (in bytes), when reached the worker be reset after the current request "
+                             "(default 2048MiB).",
                              type="int")
             group.add_option("--limit-memory-soft-gevent", dest="limit_memory_soft_gevent", my_default=False,
-                             help="Maximum allowed virtual memory per gevent worker (in bytes), when reached the worker will be "
-                             "reset after the current request. Defaults to `--limit-memory-soft`.",
+                             help="Maximum allowed resident memory (RSS) per gevent worker (in bytes), when reached the "
+                             "worker will be reset after the current request. Defaults to `--limit-memory-soft`.",
                              type="int")
             group.add_option("--limit-memory-hard", dest="limit_memory_hard", my_default=2560 * 1024 * 1024,
                              help="Maximum allowed virtual memory per worker (in bytes), when reached, any memory "
@@ -365,6 +384,10 @@ class configmanager(object):
                              help="Maximum allowed Real time per cron job. (default: --limit-time-real). "
                                   "Set to 0 for no limit. ",
                              type="int")
+            group.add_option("--limit-check-interval", dest="limit_check_interval", my_default=1.0,
+                             help="Interval in seconds between two checks of the memory usage and of "
+                                  "the cancelled requests by the threaded server (default 1).",
+                             type="float")
             group.add_option("--limit-request", dest="limit_request", my_default=2**16,
                              help="Maximum number of request to be processed per worker (default 65536).",
                              type="int")
@@ -475,7 +498,7 @@ class configmanager(object):
                 'syslog', 'without_demo', 'screencasts', 'screenshots',
                 'dbfilter', 'log_level', 'log_db',
                 'log_db_level', 'geoip_city_db', 'geoip_country_db', 'dev_mode',
-                'shell_interface', 'limit_time_worker_cron',
+                'shell_interface', 'limit_time_worker_cron', 'memory_sampling_rate',
         ]
 
         for arg in keys:
@@ -495,8 +518,8 @@ class configmanager(object):
         keys = [
             'language', 'translate_out', 'translate_in', 'overwrite_existing_translations',
             'dev_mode', 'shell_interface', 'smtp_ssl', 'load_language',
-            'stop_after_init', 'without_demo', 'http_enable', 'syslog',
-            'list_db', 'proxy_mode',
+            'stop_after_init', 'profile_startup', 'without_demo', 'http_enable', 'syslog',
+            'list_db', 'proxy_mode', 'asgi', 'metrics_enable',
             'test_file', 'test_tags',
             'osv_memory_count_limit', 'transient_age_limit', 'max_cron_threads', 'unaccent',
             'data_dir',
@@ -506,7 +529,8 @@ class configmanager(object):
         posix_keys = [
             'workers',
             'limit_memory_hard', 'limit_memory_hard_gevent', 'limit_memory_soft', 'limit_memory_soft_gevent',
-            'limit_time_cpu', 'limit_time_real', 'limit_request', 'limit_time_real_cron'
+            'limit_time_cpu', 'limit_time_real', 'limit_request', 'limit_time_real_cron',
+            'limit_check_interval',
         ]
 
         if os.name == 'posix':
@@ -2,17 +2,10 @@
 # Part of Inphms, see License file for full copyright and licensing details.
 import base64
 import binascii
+import functools
 import io
 from typing import Tuple, Union
 
-from PIL import Image, ImageOps
-# We can preload Ico too because it is considered safe
-from PIL import IcoImagePlugin
-try:
-    from PIL.Image import Transpose, Palette, Resampling
-except ImportError:
-    Transpose = Palette = Resampling = Image
-
 from random import randrange
 
 from inphms.exceptions import UserError
@@ -23,10 +16,6 @@ from inphms.tools.misc import DotDict
 __all__ = ["image_process"]
 # _lt = LazyTranslate('base')
 
-# Preload PIL with the minimal subset of image formats we need
-Image.preinit()
-Image._initialized = 2
-
 # Maps only the 6 first bits of the base64 data, accurate enough
 # for our purpose and faster than decoding the full blob first
 FILETYPE_BASE64_MAGICWORD = {
@@ -38,24 +27,48 @@ FILETYPE_BASE64_MAGICWORD = {
 }
 
 EXIF_TAG_ORIENTATION = 0x112
-# The target is to have 1st row/col to be top/left
-# Note: rotate is counterclockwise
-EXIF_TAG_ORIENTATION_TO_TRANSPOSE_METHODS = { # Initial side on 1st row/col:
-    0: [],                                              # reserved
-    1: [],                                              # top/left
-    2: [Transpose.FLIP_LEFT_RIGHT],                     # top/right
-    3: [Transpose.ROTATE_180],                          # bottom/right
-    4: [Transpose.FLIP_TOP_BOTTOM],                     # bottom/left
-    5: [Transpose.FLIP_LEFT_RIGHT, Transpose.ROTATE_90],# left/top
-    6: [Transpose.ROTATE_270],                          # right/top
-    7: [Transpose.FLIP_TOP_BOTTOM, Transpose.ROTATE_90],# right/bottom
-    8: [Transpose.ROTATE_90],                           # left/bottom
-}
 
 # Arbitrary limit to fit most resolutions, including Samsung Galaxy A22 photo,
 # 8K with a ratio up to 16:10, and almost all variants of 4320p
 IMAGE_MAX_RESOLUTION = 50e6
 
+
+@functools.cache
+def _pil():
+    """ Import PIL on first image operation, as it is slow to import, and
+    preload it with the minimal subset of image formats we need. Return the
+    ``PIL.Image`` module. """
+    from PIL import Image  # noqa: PLC0415
+    # We can preload Ico too because it is considered safe
+    from PIL import IcoImagePlugin  # noqa: PLC0415, F401
+    Image.preinit()
+    Image._initialized = 2
+    return Image
+
+@functools.cache
+def _exif_tag_orientation_to_transpose_methods():
+    Image = _pil()
+    Transpose = getattr(Image, 'Transpose', Image)
+    # The target is to have 1st row/col to be top/left
+    # Note: rotate is counterclockwise
+    return { # Initial side on 1st row/col:
+        0: [],                                              # reserved
+        1: [],                                              # top/left
+        2: [Transpose.FLIP_LEFT_RIGHT],                     # top/right
+        3: [Transpose.ROTATE_180],                          # bottom/right
+        4: [Transpose.FLIP_TOP_BOTTOM],                     # bottom/left
+        5: [Transpose.FLIP_LEFT_RIGHT, Transpose.ROTATE_90],# left/top
+        6: [Transpose.ROTATE_270],                          # right/top
+        7: [Transpose.FLIP_TOP_BOTTOM, Transpose.ROTATE_90],# right/bottom
+        8: [Transpose.ROTATE_90],                           # left/bottom
+    }
+
+def __getattr__(name):
+    # the PIL-dependent constants are computed on first access, see _pil()
+    if name == 'EXIF_TAG_ORIENTATION_TO_TRANSPOSE_METHODS':
+        return _exif_tag_orientation_to_transpose_methods()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 class ImageProcess:
     
     def __init__(self, source, verify_resolution=True):
@@ -82,7 +95,7 @@ class ImageProcess:
             self.image = False
         else:
             try:
-                self.image = Image.open(io.BytesIO(source))
+                self.image = _pil().open(io.BytesIO(source))
             except (OSError, binascii.Error):
                 raise UserError(_lt("This file could not be decoded as an image file."))
 
@@ -1,11 +1,16 @@
 import collections
+import itertools
 import threading
+import time
 import typing
 from collections.abc import Iterable, Iterator, MutableMapping
 
 from .func import locked
 
-__all__ = ['LRU']
+__all__ = ['LRU', 'ShardedLRU']
+
+# default number of shards of a ShardedLRU
+SHARDS = 16
 
 K = typing.TypeVar('K')
 V = typing.TypeVar('V')
@@ -14,35 +19,69 @@ class LRU(MutableMapping[K, V], typing.Generic[K, V]):
     """
     Implementation of a length-limited O(1) LRU map.
 
+    When ``max_size`` is given, the map is also bounded by the total size of
+    its values, as given to :meth:`set_size`. Values without a size count for
+    nothing. The number of entries evicted to respect the bounds is counted in
+    ``evictions``.
+
+    When ``ttl`` is given, the entries expire that many seconds after they
+    are set: they are dropped when looked up, or when they reach the least
+    recently used end of the map. The number of expired entries is counted in
+    ``expirations``.
+
     Original Copyright 2003 Josiah Carlson, later rebuilt on OrderedDict and added typing.
     """
-    def __init__(self, count: int, pairs: Iterable[tuple[K, V]] = ()):
+    def __init__(self, count: int, pairs: Iterable[tuple[K, V]] = (), max_size: int | None = None,
+                 ttl: float | None = None):
         self._lock = threading.RLock()
         self.count = max(count, 1)
+        self.max_size = max_size
+        self.ttl = ttl
         self.d: collections.OrderedDict[K, V] = collections.OrderedDict()
+        self.sizes: dict[K, int] = {}
+        self.expiries: dict[K, float] = {}
+        self.total_size = 0
+        self.evictions = 0
+        self.expirations = 0
         for key, value in pairs:
             self[key] = value
 
-    @locked
+    # the methods of the ormcache lookups take the lock themselves, as the
+    # signature binding of @locked costs more than the lookup itself
+
     def __contains__(self, obj: K) -> bool:
-        return obj in self.d
+        with self._lock:
+            if self.ttl is not None and self._expire(obj):
+                return False
+            return obj in self.d
 
-    @locked
     def __getitem__(self, obj: K) -> V:
-        a = self.d[obj]
-        self.d.move_to_end(obj, last=False)
-        return a
+        with self._lock:
+            if self.ttl is not None and self._expire(obj):
+                raise KeyError(obj)
+            a = self.d[obj]
+            self.d.move_to_end(obj, last=False)
+            return a
 
-    @locked
     def __setitem__(self, obj: K, val: V):
-        self.d[obj] = val
-        self.d.move_to_end(obj, last=False)
-        while len(self.d) > self.count:
-            self.d.popitem(last=True)
+        with self._lock:
+            self._discard(obj)
+            self.d[obj] = val
+            self.d.move_to_end(obj, last=False)
+            if self.ttl is not None:
+                self.expiries[obj] = time.monotonic() + self.ttl
+                # drop the expired entries at the end, they will not be used
+                while self.d and self._expire(next(reversed(self.d))):
+                    pass
+            while len(self.d) > self.count:
+                key, _val = self.d.popitem(last=True)
+                self._discard(key)
+                self.evictions += 1
 
     @locked
     def __delitem__(self, obj: K):
         del self.d[obj]
+        self._discard(obj)
 
     @locked
     def __len__(self) -> int:
@@ -54,8 +93,179 @@ class LRU(MutableMapping[K, V], typing.Generic[K, V]):
 
     @locked
     def pop(self, key: K) -> V:
-        return self.d.pop(key)
+        val = self.d.pop(key)
+        self._discard(key)
+        return val
+
+    @locked
+    def snapshot(self) -> list[tuple[K, V]]:
+        """ Return the entries from the most recently used one, without
+        marking them as used. """
+        return list(self.d.items())
 
     @locked
     def clear(self):
-        self.d.clear()
\ No newline at end of file
+        self.d.clear()
+        self.sizes.clear()
+        self.expiries.clear()
+        self.total_size = 0
+
+    @locked
+    def set_size(self, obj: K, size: int) -> list[tuple[K, int]]:
+        """ Set the size of the value at ``obj``, and evict the least recently
+        used entries until the total size fits in ``max_size``. The entry at
+        ``obj`` itself is never evicted.
+
+        :return: the evicted keys with their size
+        """
+        if obj not in self.d:
+            raise KeyError(obj)
+        self.total_size -= self.sizes.get(obj, 0)
+        self.sizes[obj] = size
+        self.total_size += size
+        evicted = []
+        if self.max_size is None:
+            return evicted
+        for key in reversed(list(self.d)):
+            if self.total_size <= self.max_size:
+                break
+            if key != obj:
+                del self.d[key]
+                evicted.append((key, self._discard(key)))
+        self.evictions += len(evicted)
+        return evicted
+
+    def _discard(self, obj: K) -> int:
+        """ Forget the size and the expiry of ``obj``, and return its size. """
+        self.expiries.pop(obj, None)
+        size = self.sizes.pop(obj, 0)
+        self.total_size -= size
+        return size
+
+    def _expire(self, obj: K) -> bool:
+        """ Drop the entry at ``obj`` if it expired, and return whether it did. """
+        expiry = self.expiries.get(obj)
+        if expiry is None or expiry > time.monotonic():
+            return False
+        del self.d[obj]
+        self._discard(obj)
+        self.expirations += 1
+        return True
+
+
+class ShardedLRU(MutableMapping[K, V], typing.Generic[K, V]):
+    """
+    Map with the API of :class:`LRU`, split in shards by the hash of the keys.
+
+    Every shard is an :class:`LRU` with its own lock, so that threads
+    accessing different keys don't wait for each other. The least recently
+    used entries are evicted per shard, which approximates a global LRU
+    order. The bound ``count`` is divided evenly between the shards, there
+    are never more shards than ``count``.
+
+    A map bounded by ``max_size`` has a single shard: divided between shards,
+    the size bound would let a single large value evict every other entry of
+    its shard.
+    """
+    def __init__(self, count: int, pairs: Iterable[tuple[K, V]] = (), max_size: int | None = None,
+                 ttl: float | None = None, shards: int = SHARDS):
+        self.count = max(count, 1)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._nshards = 1 if max_size is not None else min(max(shards, 1), self.count)
+        self._shards = tuple(
+            LRU(
+                self.count // self._nshards + (index < self.count % self._nshards),
+                max_size=max_size,
+                ttl=ttl,
+            )
+            for index in range(self._nshards)
+        )
+        for key, value in pairs:
+            self[key] = value
+
+    def _shard(self, obj: K) -> LRU[K, V]:
+        return self._shards[hash(obj) % self._nshards]
+
+    def __contains__(self, obj: K) -> bool:
+        return obj in self._shards[hash(obj) % self._nshards]
+
+    def __getitem__(self, obj: K) -> V:
+        return self._shards[hash(obj) % self._nshards][obj]
+
+    def __setitem__(self, obj: K, val: V):
+        self._shards[hash(obj) % self._nshards][obj] = val
+
+    def __delitem__(self, obj: K):
+        del self._shard(obj)[obj]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __iter__(self) -> Iterator[K]:
+        return itertools.chain.from_iterable(self._shards)
+
+    def pop(self, key: K) -> V:
+        return self._shard(key).pop(key)
+
+    def snapshot(self) -> list[tuple[K, V]]:
+        """ Return the entries shard by shard, without marking them as used. """
+        return [item for shard in self._shards for item in shard.snapshot()]
+
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+
+    def set_size(self, obj: K, size: int) -> list[tuple[K, int]]:
+        """ Set the size of the value at ``obj``, and evict the least recently
+        used entries until the total size fits in ``max_size``.
+
+        :return: the evicted keys with their size
+        """
+        return self._shard(obj).set_size(obj, size)
+
+    @property
+    def total_size(self) -> int:
+        return sum(shard.total_size for shard in self._shards)
+
+    @property
+    def evictions(self) -> int:
+        return sum(shard.evictions for shard in self._shards)
+
+    @property
+    def expirations(self) -> int:
+        return sum(shard.expirations for shard in self._shards)
+
+
+if __name__ == '__main__':
+    # contention benchmark: python -m inphms.tools.lru [threads...]
+    import sys
+
+    def bench(cache, nthreads, lookups=100_000, nkeys=1024):
+        """ Return the lookups per second of ``nthreads`` threads hitting
+        ``cache`` concurrently, with the occasional miss. """
+        keys = [('res.users', 'method', index) for index in range(nkeys)]
+        barrier = threading.Barrier(nthreads + 1)
+
+        def run(offset):
+            barrier.wait()
+            for index in range(offset, offset + lookups):
+                key = keys[index * 7 % nkeys]
+                try:
+                    cache[key]
+                except KeyError:
+                    cache[key] = key
+
+        threads = [threading.Thread(target=run, args=(index * 997,)) for index in range(nthreads)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return nthreads * lookups / (time.perf_counter() - start)
+
+    for nthreads in map(int, sys.argv[1:] or (1, 4, 16)):
+        for cls in (LRU, ShardedLRU):
+            rate = bench(cls(1536), nthreads)
+            print(f"{cls.__name__:>10} {nthreads:3d} threads: {rate:12,.0f} lookups/s")
@@ -0,0 +1,120 @@
+# Part of Inphms, see License file for full copyright and licensing details.
+""" Attribution of the memory allocations to the HTTP requests.
+
+With ``--memory-sampling-rate``, :mod:`tracemalloc` traces the allocations
+of the process, and a fraction of the requests is sampled: the memory they
+leave allocated and their peak allocation are measured from the traced
+memory counters, and accumulated per route. Those counters are global to the
+process, so only one request is sampled at a time, and the allocations made
+in the meantime by the other threads are counted as well; the sampling evens
+them out over time.
+
+The top allocating routes are logged when the soft memory limit is reached,
+along with the source lines holding the most memory, which takes a snapshot
+of the traces: this helps hunting memory regressions in production.
+"""
+import collections
+import contextlib
+import logging
+import random
+import threading
+import tracemalloc
+
+from .config import config
+
+_logger = logging.getLogger(__name__)
+
+# number of frames kept in the traceback of every allocation
+TRACEBACK_FRAMES = 1
+# number of routes and source lines reported
+TOP_LIMIT = 10
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+_lock = threading.Lock()
+# held during the sampled request, see sample_request()
+_sampling_lock = threading.Lock()
+# {route: [samples, total size, max size, max peak]}
+_routes = collections.defaultdict(lambda: [0, 0, 0, 0])
+
+
+def start():
+    """ Start tracing the allocations if the sampling is enabled. """
+    if config['memory_sampling_rate'] and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_FRAMES)
+        _logger.info("Tracing the memory allocations of %g%% of the requests",
+                     config['memory_sampling_rate'] * 100)
+
+
+@contextlib.contextmanager
+def sample_request():
+    """ Measure the memory left allocated by the current request and its
+    peak allocation, if it is part of the sample. The request is identified
+    by the ``route`` or the ``url`` attribute of the current thread. """
+    if (
+        not tracemalloc.is_tracing()
+        or random.random() >= config['memory_sampling_rate']
+        # the peak is global, another request is being sampled
+        or not _sampling_lock.acquire(blocking=False)
+    ):
+        yield
+        return
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        yield
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        _sampling_lock.release()
+        size = max(current - before, 0)
+        peak -= before
+        thread = threading.current_thread()
+        route = getattr(thread, 'route', None) or getattr(thread, 'url', None) or '?'
+        with _lock:
+            stats = _routes[route]
+            stats[0] += 1
+            stats[1] += size
+            stats[2] = max(stats[2], size)
+            stats[3] = max(stats[3], peak)
+
+
+def top_routes(limit=TOP_LIMIT):
+    """ Return the routes that allocated the most, as a list of tuples
+    ``(route, samples, total size, max size, max peak)``. """
+    with _lock:
+        items = sorted(_routes.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    return [(route, *stats) for route, stats in items]
+
+
+def top_lines(limit=TOP_LIMIT):
+    """ Return the source lines holding the most traced memory, as a list of
+    pairs ``(line, size)``. This takes a snapshot of all the traces, which is
+    expensive: it is meant for an explicit dump. """
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    return [
+        (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size)
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def log_top(level=logging.INFO):
+    """ Log the routes that allocated the most, and the source lines holding
+    the most memory. """
+    if not tracemalloc.is_tracing():
+        return
+    routes = top_routes()
+    if not routes:
+        _logger.log(level, "No request sampled yet for memory allocations")
+    for route, samples, total, maximum, peak in routes:
+        _logger.log(level, "Memory allocated by %s: %d KiB in %d sampled requests, max %d KiB, peak %d KiB",
+                    route, total // 1024, samples, maximum // 1024, peak // 1024)
+    for line, size in top_lines():
+        _logger.log(level, "Memory held at %s: %d KiB", line, size // 1024)
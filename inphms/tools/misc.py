@@ -5,6 +5,7 @@ Miscellaneous tools used by Inphms.
 from __future__ import annotations
 
 import base64
+import bisect
 import collections
 import csv
 import datetime
@@ -300,6 +301,24 @@ POSIX_TO_LDML = {
 # ---------------------------------------------
 # String management
 # ---------------------------------------------
+def stripped_sys_argv(*strip_args: str) -> list[str]:
+    """Return sys.argv with some arguments stripped, suitable for reexecution or subprocesses"""
+    strip_args = sorted(set(strip_args) | set(['-s', '--save', '-u', '--update', '-i', '--init', '--i18n-overwrite']))
+    assert all(config.parser.has_option(s) for s in strip_args)
+    takes_value = {s: config.parser.get_option(s).takes_value() for s in strip_args}
+
+    longs, shorts = list(tuple(y) for _, y in itergroupby(strip_args, lambda x: x.startswith('--')))
+    longs_eq = tuple(l + '=' for l in longs if takes_value[l])
+
+    args = sys.argv[:]
+
+    def strip(args, i):
+        return args[i].startswith(shorts) \
+            or args[i].startswith(longs_eq) or (args[i] in longs) \
+            or (i >= 1 and (args[i - 1] in strip_args) and takes_value[args[i - 1]])
+
+    return [x for i, x in enumerate(args) if not strip(args, i)]
+
 def dumpstacks(sig=None, frame=None, thread_idents=None, log_level=logging.INFO):
     """ Signal handler: dump a stack trace for each existing thread or given
     thread(s) specified through the ``thread_idents`` sequence.
@@ -455,6 +474,19 @@ def submap(mapping: Mapping[K, T], keys: Iterable[K]) -> Mapping[K, T]: #ichecke
     keys = frozenset(keys)
     return {key: mapping[key] for key in mapping if key in keys}
 
+def freehash(arg: typing.Any) -> int:
+    """ Return a hash of ``arg``, which may contain unhashable values like
+    dicts, lists or sets. """
+    try:
+        return hash(arg)
+    except Exception:
+        if isinstance(arg, Mapping):
+            return hash(frozendict(arg))
+        elif isinstance(arg, Iterable):
+            return hash(frozenset(freehash(item) for item in arg))
+        else:
+            return id(arg)
+
 class frozendict(dict[K, T], typing.Generic[K, T]):
     """ An implementation of an immutable dictionary. """
     __slots__ = ()
@@ -604,6 +636,59 @@ class StackMap(MutableMapping[K, T], typing.Generic[K, T]):
     def popmap(self) -> MutableMapping[K, T]:
         return self._maps.pop()
 
+class Histogram:
+    """ Distribution of observed values, counted in buckets of increasing
+    upper bounds, like the Prometheus histograms. Thread-safe.
+
+    :param bounds: the upper bounds of the buckets, the last bucket (for the
+        values above every bound) is implicit
+    """
+    __slots__ = ('_lock', 'bounds', 'count', 'counts', 'sum')
+
+    def __init__(self, bounds: Iterable[float]):
+        self._lock = threading.Lock()
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def buckets(self) -> list[tuple[float, int]]:
+        """ Return the cumulative count of values for every upper bound,
+        ending with ``inf``. """
+        with self._lock:
+            counts = list(itertools.accumulate(self.counts))
+        return list(zip(self.bounds + (float('inf'),), counts))
+
+    def quantile(self, q: float) -> float:
+        """ Return the upper bound of the bucket holding the ``q`` quantile,
+        or 0 when there is no value. """
+        rank = q * self.count
+        for bound, count in self.buckets():
+            if count and count >= rank:
+                return bound
+        return 0.0
+
+    def to_dict(self) -> dict:
+        # the count of the last bucket is the total count
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': [[bound, count] for bound, count in self.buckets()[:-1]],
+        }
+
+    def __repr__(self):
+        mean = self.sum / self.count if self.count else 0.0
+        return (f"{self.count} values, mean {mean:.3f}, "
+                f"p50 <= {self.quantile(0.5):g}, p95 <= {self.quantile(0.95):g}")
+
+
 class OrderedSet(MutableSet[T], typing.Generic[T]):
     """ A set collection that remembers the elements first insertion order. """
     __slots__ = ['_map']